@@ -40,6 +40,8 @@ setup(
         "console_scripts": [
             "termax=termax.cli.cli:cli",
             "t=termax.cli.cli:cli",
+            "termaxd=termax.daemon.server:main",
+            "termaxc=termax.daemon.client:main",
         ]
     },
     include_package_data=True,
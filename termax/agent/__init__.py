@@ -1,7 +1,30 @@
-from ._qianfan import *
-from ._qianwen import *
-from ._mistral import *
-from ._claude import *
-from ._gemini import *
-from ._openai import *
-from ._ollama import *
+import importlib
+
+from .types import Model
+
+# the providers are loaded on first access, so importing `termax.agent` does not pull in every LLM client.
+_PROVIDERS = {
+    'QianFanModel': '._qianfan',
+    'QianWenModel': '._qianwen',
+    'MistralModel': '._mistral',
+    'ClaudeModel': '._claude',
+    'GeminiModel': '._gemini',
+    'OpenAIModel': '._openai',
+    'OllamaModel': '._ollama',
+}
+
+__all__ = ['Model'] + list(_PROVIDERS)
+
+
+def __getattr__(name):
+    """
+    __getattr__: lazily import the provider module that defines the requested model.
+    Args:
+        name: the name of the model class, e.g. `OpenAIModel`.
+    """
+    if name not in _PROVIDERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    model = getattr(importlib.import_module(_PROVIDERS[name], __name__), name)
+    globals()[name] = model
+    return model
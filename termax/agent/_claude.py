@@ -48,6 +48,12 @@ class ClaudeModel(Model):
             stop_sequences=self.generation_config['stop_sequences'],
             messages=[{"role": "user", "content": text}]
         )
+        cached_tokens = getattr(message.usage, 'cache_read_input_tokens', None) or 0
+        self.usage = {
+            'prompt_tokens': message.usage.input_tokens + cached_tokens
+            + (getattr(message.usage, 'cache_creation_input_tokens', None) or 0),
+            'cached_tokens': cached_tokens
+        }
         response = message.content[0].text
         return extract_shell_commands(response)
 
@@ -49,12 +49,20 @@ class OpenAIModel(Model):
                 {"role": "user", "content": text}
             ]
 
+            # the system prompt starts with its static prefix, the cached tokens are reported in the usage.
             completion = self.client.chat.completions.create(
                 model=self.version,
                 messages=chat_history,
                 temperature=self.temperature,
                 functions=get_all_function_schemas()
             )
+            usage = completion.usage
+            if usage:
+                details = getattr(usage, 'prompt_tokens_details', None)
+                self.usage = {
+                    'prompt_tokens': usage.prompt_tokens,
+                    'cached_tokens': getattr(details, 'cached_tokens', None) or 0
+                }
 
             function = completion.choices[0].message.function_call
             if function:
@@ -5,6 +5,8 @@ class Model(ABC):
 
     def __init__(self):
         self.model_type = None
+        # the token usage of the last request, including the prompt tokens served from the provider cache.
+        self.usage = {}
 
     @abstractmethod
     def to_command(self, prompt, text):
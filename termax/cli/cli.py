@@ -1,14 +1,14 @@
 import click
-from rich.console import Console
 
 import termax
 from .utils import *
 from termax.utils.const import *
-from termax.prompt import Prompt, Memory
-from termax.plugin import install_plugin, uninstall_plugin
+from termax.prompt import Prompt
 from termax.utils import Config, CONFIG_PATH, qa_confirm, qa_action, qa_prompt, qa_revise
 
-memory = Memory()
+# NOTE: heavy dependencies (the vector database, LLM clients, rich and the plugins) are imported
+# inside the commands which need them, every shell plugin call starts a fresh process.
+
 # avoid the tokenizers parallelism issue
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
 
@@ -36,6 +36,16 @@ class DefaultCommandGroup(click.Group):
 
         return decorator
 
+    def parse_args(self, ctx, args):
+        """
+        parse_args: pass the leading options which the group does not know to the default command.
+        """
+        if args and args[0].startswith('-'):
+            options = {opt for param in self.get_params(ctx) for opt in param.opts + param.secondary_opts}
+            if args[0] not in options:
+                args.insert(0, self.default_command)
+        return super(DefaultCommandGroup, self).parse_args(ctx, args)
+
     def resolve_command(self, ctx, args):
         """
         resolve_command: resolve the command.
@@ -63,7 +73,10 @@ def guess():
     """
     Guess the next command based on the information provided.
     """
+    from rich.console import Console
+
     console = Console()
+    memory = get_memory()
     prompt = Prompt(memory)
     configuration = Config()
 
@@ -87,7 +100,7 @@ def guess():
 
     with console.status(f"[cyan]Guessing..."):
         primary, description = intent['primary'], intent['description']
-        guess_prompt = prompt.gen_suggestions(primary, platform)
+        guess_prompt = prompt.gen_suggestions(primary)
         command = model.to_command(prompt=guess_prompt, text=description)
 
     click.echo(f"\nSuggestion:\n")
@@ -120,19 +133,25 @@ def guess():
         command_success = True
     finally:
         if choice == 2 and command_success:
-            save_command(command, description, config_dict, memory)
+            save_command(command, description, config_dict)
 
 
 @cli.command(default_command=True)
 @click.argument('text', nargs=-1)
 @click.option('--print_cmd', '-p', is_flag=True, help="Print the generated command only.")
-def generate(text, print_cmd=False):
+@click.option('--no-cache', 'no_cache', is_flag=True, help="Bypass the cached commands.")
+@click.option('--verbose', '-v', is_flag=True, help="Show the prompt tokens used, and how many were cached.")
+def generate(text, print_cmd=False, no_cache=False, verbose=False):
     """
     This function will call and generate the commands from LLM
     Args:
         text: the text to be converted into a command.
         print_cmd: if True, only print the generated command.
+        no_cache: if True, always generate the command from LLM.
+        verbose: if True, show the token usage of the LLM.
     """
+    from rich.console import Console
+
     console = Console()
     text = " ".join(text)
     configuration = Config()
@@ -142,7 +161,6 @@ def generate(text, print_cmd=False):
         click.echo("Config file not found. Running config setup...")
         build_config()
 
-    prompt = Prompt(memory)
     config_dict = configuration.read()
     if not configuration.config.has_section(CONFIG_SEC_GENERAL):
         click.echo(f"General section not found. Running config setup...")
@@ -155,29 +173,36 @@ def generate(text, print_cmd=False):
         build_config()
         config_dict = configuration.read()
 
-    # load the LLM model
-    model, platform = load_model()
-    # generate the commands from the model, and execute if auto_execute is True
-    with console.status(f"[cyan]Generating..."):
-        # loop until the generated command is not ''.
-        for i in range(3):
-            command = model.to_command(prompt.gen_commands(text, platform), text)
-            if command == None:
-                return
-            elif command != '':
-                if not command.startswith('t ') and not command.startswith('termax '):
-                    break
-                else:
-                    text = text + ", do not use command t or termax."
-            if i == 2:
-                console.log("Unable to generate the command, please try again.")
-                return
+    # serve the repeated intents from the result cache, the model, the memory and the prompt are only built on a miss.
+    # only the commands executed successfully are cached, by `save_command`.
+    model = None
+    command = None if no_cache else get_result_cache(config_dict).get(get_cache_key(text, config_dict))
+    if command is None:
+        # load the LLM model, generate the commands from the model, and execute if auto_execute is True
+        model, _ = load_model()
+        with console.status(f"[cyan]Generating..."):
+            command = generate_command(model, Prompt(get_memory()), text)
+
+        if command is None:
+            return
+        elif command == '':
+            console.log("Unable to generate the command, please try again.")
+            return
+
+    if verbose:
+        # on stderr, so that the output of `-p` stays a bare command.
+        if model is None:
+            click.echo("Prompt tokens: 0, the command is served from the result cache.", err=True)
+        elif model.usage:
+            click.echo(f"Prompt tokens: {model.usage['prompt_tokens']} ({model.usage['cached_tokens']} cached)", err=True)
+        else:
+            click.echo("Prompt tokens: not reported, by the memory or by the platform.", err=True)
 
     if print_cmd:
         print(command)
         # TODO: improve the RAG compatibility using the shell plugin.
         # the command generate using the shell plugin will not be saved in the memory.
-        # save_command(command, text, config_dict, memory)
+        # save_command(command, text, config_dict)
     else:
         if config_dict['general']['show_command'] == "True":
             console.log(command, style="purple")
@@ -192,15 +217,17 @@ def generate(text, print_cmd=False):
                 if choice == 0:
                     command_success = execute_command(command)
                 elif choice == 2:
+                    if model is None:
+                        model, _ = load_model()
                     with console.status(f"[cyan]Generating..."):
-                        description = model.to_description(prompt.explain_commands(), command)
+                        description = model.to_description(Prompt(get_memory()).explain_commands(), command)
                     console.log(f"{description}")
         except KeyboardInterrupt:
             command_success = True
         finally:
             if config_dict['general']['auto_execute'] == "True" or choice == 0:
                 if command_success:
-                    save_command(command, text, config_dict, memory)
+                    save_command(command, text, config_dict)
 
 
 @cli.command()
@@ -220,6 +247,7 @@ def install(name: str):
     Args:
         name: the name of the plugin, should be in the PLUGIN_LIST.
     """
+    from termax.plugin import install_plugin
     install_plugin(name)
 
 
@@ -231,33 +259,134 @@ def uninstall(name: str):
     Args:
         name: the name of the plugin, should be in the PLUGIN_LIST.
     """
+    from termax.plugin import uninstall_plugin
     uninstall_plugin(name)
 
 
-@cli.command()
+@cli.group(invoke_without_command=True)
 @click.option('--clear', '-c', is_flag=True, help="Clear the memory.")
-def rag(clear: bool = False):
+@click.option('--limit', '-n', type=int, default=None, help="Show at most this number of commands.")
+@click.option('--offset', type=int, default=0, help="Skip this number of commands.")
+@click.option('--since', type=click.DateTime(), default=None, help="Show the commands saved since this date.")
+@click.option('--contains', type=str, default=None, help="Show the commands whose input contains this text.")
+@click.option('--where', type=str, default=None, help='Filter on the metadata in JSON, e.g. \'{"hit_count": {"$gt": 0}}\'.')
+@click.option('--json', 'as_json', is_flag=True, help="Print one JSON object per command.")
+@click.pass_context
+def rag(ctx, clear: bool = False, limit: int = None, offset: int = 0, since=None, contains: str = None,
+        where: str = None, as_json: bool = False):
     """
     Show all the historical commands in the RAG.
     """
+    if ctx.invoked_subcommand is not None:
+        return
+
+    import json
+    from rich.console import Console
+
     console = Console()
-    commands = memory.get()
+    memory = get_memory()
 
     if clear:
         memory.delete()
         console.log("Memory cleared successfully.")
         return
 
-    if commands:
-        metadatas = commands['metadatas']
-        documents = commands['documents']
-        idx = commands['ids']
-
-        for i in range(len(idx)):
-            console.log(f"""
-                User Input: {documents[i]}
-                Generated Commands: {metadatas[i]['response']}
-                Date: {metadatas[i]['created_at']}\n
+    try:
+        filters = [json.loads(where)] if where else []
+    except ValueError as e:
+        raise click.BadParameter(f"invalid JSON: {e}", param_hint='--where')
+    if since:
+        filters.append({'created_ts': {'$gte': since.timestamp()}})
+    found = False
+    for page in memory.iter_records(
+            where=filters[0] if len(filters) == 1 else {'$and': filters} if filters else None,
+            where_document={'$contains': contains} if contains else None,
+            limit=limit,
+            offset=offset
+    ):
+        found = True
+        for record_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            if as_json:
+                click.echo(json.dumps({'id': record_id, 'query': document, **metadata}))
+            else:
+                console.log(f"""
+                User Input: {document}
+                Generated Commands: {metadata['response']}
+                Date: {metadata['created_at']}\n
                 """)
-    else:
+
+    if not found and not as_json:
         console.log("No commands found in the memory.")
+
+
+@rag.command(name='import')
+@click.option('--reset', is_flag=True, help="Import from the start of the history instead of the last checkpoint.")
+@click.option('--snapshot', type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Import a snapshot exported by 'rag export' instead of the shell history.")
+def rag_import(reset: bool = False, snapshot: str = None):
+    """
+    Import the shell history or a snapshot into the RAG.
+    """
+    from rich.console import Console
+    from termax.prompt import import_snapshot
+
+    console = Console()
+    memory = get_memory()
+    config_dict = Config().read()
+
+    with console.status(f"[cyan]Importing...") as status:
+        callback = lambda count: status.update(f"[cyan]Importing... {count} commands")
+        if snapshot:
+            try:
+                imported = import_snapshot(memory, snapshot, callback=callback)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        else:
+            imported = import_command_history(
+                memory, reset, max_count=get_storage_size(config_dict), callback=callback
+            )
+        # keep the memory within the storage size, the least recently used commands are evicted first.
+        memory.evict(get_storage_size(config_dict))
+
+    console.log(f"Imported {imported} commands from the {'snapshot' if snapshot else 'shell history'}.")
+
+
+@rag.command(name='export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+def rag_export(path: str):
+    """
+    Export the RAG with the embeddings into a snapshot file.
+    """
+    from rich.console import Console
+    from termax.prompt import export_snapshot
+
+    console = Console()
+    with console.status(f"[cyan]Exporting..."):
+        exported = export_snapshot(get_memory(), path)
+
+    console.log(f"Exported {exported} commands to {path}.")
+
+
+@rag.command(name='cache')
+@click.option('--clear', '-c', is_flag=True, help="Clear the cached commands.")
+def rag_cache(clear: bool = False):
+    """
+    Show the statistics of the cached commands.
+    """
+    from rich.console import Console
+
+    console = Console()
+    result_cache = get_result_cache(Config().read())
+
+    if clear:
+        result_cache.clear()
+        console.log("Cache cleared successfully.")
+        return
+
+    stats = result_cache.stats()
+    console.log(f"""
+        Cached Commands: {stats['size']}
+        Hits: {stats['hits']}
+        Misses: {stats['misses']}
+        Hit Rate: {stats['hit_rate']:.1%}
+        """)
@@ -1,13 +1,64 @@
 import os
+import click
 import platform
 import subprocess
-import pyperclip
+from datetime import datetime
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from termax.prompt import Memory
-from termax.agent import OpenAIModel, OllamaModel, GeminiModel, ClaudeModel, QianFanModel, MistralModel, QianWenModel
-from termax.utils import Config, qa_general, qa_platform
+from termax.prompt import Memory, make_record_id, append_journal, flush_journal
+from termax.utils import Config, ResultCache, qa_general, qa_platform, read_cache, write_cache
+from termax.utils.metadata import get_history_file, iter_command_history, get_project_metadata
 from termax.utils.const import *
 
+# the shared memory instance, created on the first call of `get_memory`.
+_memory = None
+
+
+def get_memory():
+    """
+    get_memory: get the shared memory instance, the vector database is only opened on the first call.
+    """
+    global _memory
+    if _memory is None:
+        _memory = Memory()
+        # the commands saved by the previous invocations are added once the memory is opened.
+        try:
+            flush_journal(_memory, get_storage_size(Config().read()))
+        except Exception as e:
+            # e.g. offline, the journal is kept and flushed by the next attempt.
+            click.echo(f"Failed to flush the journal: {e}", err=True)
+    return _memory
+
+
+def get_storage_size(config_dict: dict):
+    """
+    get_storage_size: the maximum number of records in the memory, default is 2000.
+    Args:
+        config_dict: config dictionary
+    """
+    return int(config_dict.get(CONFIG_SEC_GENERAL, {}).get('storage_size', 2000))
+
+
+def get_result_cache(config_dict: dict):
+    """
+    get_result_cache: get the result cache with the configured time to live.
+    Args:
+        config_dict: config dictionary
+    """
+    return ResultCache(ttl=int(config_dict.get(CONFIG_SEC_GENERAL, {}).get('result_cache_ttl', RESULT_CACHE_TTL)))
+
+
+def get_cache_key(text: str, config_dict: dict):
+    """
+    get_cache_key: the result cache key of the text in the current environment.
+    Args:
+        text: the text to be converted into a command.
+        config_dict: config dictionary
+    """
+    platform = config_dict[CONFIG_SEC_GENERAL]['platform']
+    return ResultCache.make_key(text, platform, config_dict.get(platform, {}).get('model'))
+
 
 def build_config(general: bool = False):
     """
@@ -36,15 +87,18 @@ def load_model():
     plat = config_dict['general']['platform']
 
     if plat == CONFIG_SEC_OPENAI:
+        from termax.agent import OpenAIModel
         model = OpenAIModel(
             api_key=config_dict['openai'][CONFIG_SEC_API_KEY], version=config_dict['openai']['model'],
             temperature=float(config_dict['openai']['temperature']), base_url=config_dict['openai']['base_url']
         )
     elif plat == CONFIG_SEC_OLLAMA:
+        from termax.agent import OllamaModel
         model = OllamaModel(
             host_url=config_dict['ollama']['host_url'], version=config_dict['ollama']['model'],
         )
     elif plat == CONFIG_SEC_GEMINI:
+        from termax.agent import GeminiModel
         model = GeminiModel(
             api_key=config_dict['gemini'][CONFIG_SEC_API_KEY], version=config_dict['gemini']['model'],
             generation_config={
@@ -58,6 +112,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_CLAUDE:
+        from termax.agent import ClaudeModel
         model = ClaudeModel(
             api_key=config_dict['claude'][CONFIG_SEC_API_KEY], version=config_dict['claude']['model'],
             generation_config={
@@ -70,6 +125,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_QIANFAN:
+        from termax.agent import QianFanModel
         model = QianFanModel(
             api_key=config_dict['qianfan'][CONFIG_SEC_API_KEY], secret_key=config_dict['qianfan']['secret_key'],
             version=config_dict['qianfan']['model'],
@@ -80,6 +136,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_MISTRAL:
+        from termax.agent import MistralModel
         model = MistralModel(
             api_key=config_dict['mistral'][CONFIG_SEC_API_KEY], version=config_dict['mistral']['model'],
             generation_config={
@@ -89,6 +146,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_QIANWEN:
+        from termax.agent import QianWenModel
         model = QianWenModel(
             api_key=config_dict['qianwen'][CONFIG_SEC_API_KEY], version=config_dict['qianwen']['model'],
             generation_config={
@@ -106,6 +164,32 @@ def load_model():
     return model, plat
 
 
+def generate_command(model, prompt, text: str):
+    """
+    generate_command: generate the command from the memory or the LLM, retry if the command is empty or calls termax itself.
+    Args:
+        model: the loaded LLM model.
+        prompt: the prompt instance.
+        text: the text to be converted into a command.
+
+    Returns: the generated command, '' if no command can be generated, None if the model failed.
+    """
+    command = prompt.recall_command(text)
+    if command:
+        return command
+
+    for _ in range(3):
+        command = model.to_command(prompt.gen_commands(text), text)
+        if command is None:
+            return None
+        elif command != '':
+            if not command.startswith('t ') and not command.startswith('termax '):
+                return command
+            text = text + ", do not use command t or termax."
+
+    return ''
+
+
 def execute_command(command: str) -> bool:
     """
     Execute a command and return whether it was successful.
@@ -136,26 +220,118 @@ def execute_command(command: str) -> bool:
         return False
 
 
-def save_command(command: str, text: str, config_dict: dict, memory: Memory):
+def save_command(command: str, text: str, config_dict: dict):
     """
     save_command: save the command into database.
+    The command is appended to the journal, and added to the memory by the daemon or the next invocation,
+    so that the process exits without waiting for the embedding and the database.
     Args:
         command: the command to execute.
         text: the user prompt.
         config_dict: config dictionary
+    """
+    if command != '':
+        # the project is recorded now, the journal is flushed in another directory or process.
+        append_journal(text, command, get_project_metadata())
+        # the successfully executed commands are served from the result cache next time.
+        get_result_cache(config_dict).set(get_cache_key(text, config_dict), command)
+
+
+def import_command_history(
+        memory: Memory,
+        reset: bool = False,
+        max_count: int = None,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        workers: int = IMPORT_WORKERS,
+        callback=None
+):
+    """
+    import_command_history: import the shell history into the memory, so that a new install has samples to retrieve.
+    The history is streamed and deduplicated, only the most recent unique commands are kept, then the batches are
+    embedded concurrently and added from the oldest. The end of the history is checkpointed once all the batches are
+    added, an interrupted import is resumed by skipping the commands already in the memory.
+    Args:
         memory: vector database in memory
+        reset: if True, import from the start of the history instead of the checkpoint.
+        max_count: the number of the most recent unique commands to import, e.g. the storage size, all if not set.
+        batch_size: the number of commands to embed at a time.
+        workers: the maximum number of batches being embedded at the same time.
+        callback: called with the number of imported commands after each batch.
+
+    Returns: the number of imported commands.
     """
-    # add the query to the memory, eviction with the default max size of 2000.
-    if config_dict.get(CONFIG_SEC_GENERAL).get('storage_size') is None:
-        storage_size = 2000
-    else:
-        storage_size = int(config_dict[CONFIG_SEC_GENERAL]['storage_size'])
+    shell_type, history_file, history_format = get_history_file()
+    checkpoints = read_cache(CACHE_HISTORY_IMPORT, default={})
+    inode, size = os.stat(history_file).st_ino, os.path.getsize(history_file)
+    checkpoint = checkpoints.get(history_file)
+    offset = checkpoint['offset'] if checkpoint and not reset and checkpoint['inode'] == inode \
+        and checkpoint['offset'] <= size else 0
 
-    if memory.count() > storage_size:
-        memory.delete()
+    def fresh(batch: list):
+        # the commands already in the memory are skipped, e.g. imported before the checkpoint.
+        existing = memory.existing_ids([record_id for record_id, _ in batch]) if batch else set()
+        return [(record_id, entry) for record_id, entry in batch if record_id not in existing]
 
-    if command != '':
-        memory.add_query(queries=[{"query": text, "response": command}])
+    def batches():
+        # the last use of each command, the least recently used ones are dropped beyond the max count,
+        # the older commands would be evicted right after the import anyway.
+        recent = OrderedDict()
+        end = offset
+        for commands, end in iter_command_history(history_file, history_format, offset):
+            for entry in commands:
+                record_id = make_record_id(entry['command'], entry['command'])
+                recent.pop(record_id, None)
+                recent[record_id] = entry
+                if max_count is not None and len(recent) > max_count:
+                    recent.popitem(last=False)
+
+        entries = list(recent.items())
+        for start in range(0, len(entries), batch_size):
+            # the checkpoint only moves to the end of the history with the last batch.
+            yield fresh(entries[start:start + batch_size]), end if start + batch_size >= len(entries) else offset
+        if not entries:
+            yield [], end
+
+    def add(batch: list, end: int, embeddings: list):
+        if batch:
+            memory.add_query(
+                [
+                    {
+                        'query': entry['command'],
+                        'response': entry['command'],
+                        'source': shell_type,
+                        **({'last_used_at': datetime.strptime(entry['time'], '%Y-%m-%d %H:%M:%S').timestamp()}
+                           if entry['time'] else {})
+                    } for _, entry in batch
+                ],
+                idx=[record_id for record_id, _ in batch],
+                embeddings=embeddings
+            )
+        checkpoints[history_file] = {'inode': inode, 'offset': end}
+        write_cache(CACHE_HISTORY_IMPORT, checkpoints)
+        return len(batch)
+
+    imported = 0
+    pending = deque()
+
+    def drain(limit: int):
+        # the oldest batch is added first, so that the checkpoint only moves forwards.
+        nonlocal imported
+        while len(pending) > limit:
+            batch, end, future = pending.popleft()
+            imported += add(batch, end, future.result() if future else None)
+            if callback:
+                callback(imported)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch, end in batches():
+            texts = [entry['command'] for _, entry in batch]
+            pending.append((batch, end, executor.submit(memory.embedding_function, texts) if texts else None))
+            # bound the batches being embedded at the same time.
+            drain(workers - 1)
+        drain(0)
+
+    return imported
 
 
 def filter_and_format_history(command_history, filter_condition, max_count):
@@ -172,6 +348,7 @@ def copy_command(command: str):
     Args:
         command: the command to copy.
     """
+    import pyperclip
     try:
         pyperclip.copy(command)
         return True
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import socket
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+
+
+def request_daemon(request: dict, socket_path: str = None, timeout: float = DAEMON_TIMEOUT):
+    """
+    request_daemon: send a request to termaxd and wait for the response.
+    Args:
+        request: the request dictionary, e.g. {"action": "generate", "text": "...", "cwd": "..."}.
+        socket_path: the path of the Unix domain socket, default is under the Termax home.
+        timeout: the timeout in seconds.
+
+    Returns: the response dictionary, or None if the daemon is not reachable.
+    """
+    if socket_path is None:
+        socket_path = os.path.join(CONFIG_HOME, DAEMON_SOCKET)
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as file:
+                line = file.readline()
+    except OSError:
+        return None
+
+    try:
+        return json.loads(line) if line else None
+    except ValueError:
+        # a truncated or broken response, e.g. the daemon was killed while replying.
+        return None
+
+
+def main():
+    """
+    termaxc: the thin client used by the shell plugins, print the generated command from termaxd.
+    If the daemon is down, fall back to generating the command with a new Termax process.
+    """
+    text = " ".join(sys.argv[1:])
+    response = request_daemon({'action': 'generate', 'text': text, 'cwd': os.getcwd()})
+    if response is None or 'error' in response:
+        os.execvp('t', ['t', 'termax', '-p', text])
+
+    if response.get('command'):
+        print(response['command'])
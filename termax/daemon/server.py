@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import socket
+import socketserver
+
+import click
+
+import termax
+from termax.utils.const import *
+from termax.utils.config import Config, CONFIG_HOME, CONFIG_PATH
+
+
+class TermaxRequestHandler(socketserver.StreamRequestHandler):
+    """
+    TermaxRequestHandler: handle one JSON line request from the shell plugins.
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.dispatch(request)
+        except Exception as e:
+            response = {'error': str(e)}
+
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class TermaxDaemon(socketserver.UnixStreamServer):
+    """
+    TermaxDaemon: a resident server which keeps the memory, the model and the metadata warm.
+    The requests are served one by one, since each request switches to the caller's working directory.
+    """
+
+    def __init__(self, socket_path: str):
+        """
+        Args:
+            socket_path: the path of the Unix domain socket to listen on.
+        """
+        # the import of the CLI utils is deferred, the socket should be created before loading the models.
+        from termax.prompt import Prompt
+        from termax.cli.utils import get_memory
+
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, TermaxRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+        self.socket_path = socket_path
+        self.memory = get_memory()
+        # the first requests are served by the keywords until the embedding model is loaded.
+        self.memory.embedding_function.warm_up()
+        self.prompt = Prompt(self.memory)
+        self.prompt_mtime = os.path.getmtime(CONFIG_PATH)
+        self.flushed_at = time.monotonic()
+        self.model = None
+        self.platform = None
+        self.config_mtime = None
+
+    def load_model(self):
+        """
+        load_model: (re)load the model and the prompt once the configuration file has been changed,
+        the prompt reads the thresholds and the budgets from the configuration.
+        """
+        from termax.prompt import Prompt
+        from termax.cli.utils import load_model
+
+        config_mtime = os.path.getmtime(CONFIG_PATH)
+        if self.model is None or config_mtime != self.config_mtime:
+            self.model, self.platform = load_model()
+            self.config_mtime = config_mtime
+            if config_mtime != self.prompt_mtime:
+                self.prompt = Prompt(self.memory)
+                self.prompt_mtime = config_mtime
+
+        return self.model, self.platform
+
+    def dispatch(self, request: dict):
+        """
+        dispatch: dispatch the request to the action.
+        Args:
+            request: the request, in the format of {"action": "generate", "text": "...", "cwd": "..."}.
+
+        Returns: the response dictionary.
+        """
+        action = request.get('action')
+        if action == 'ping':
+            return {'status': 'ok', 'version': termax.__version__, 'pid': os.getpid()}
+        elif action == 'generate':
+            command = self.generate(request['text'], request.get('cwd'), request.get('no_cache', False))
+            return {'command': command, 'usage': getattr(self.model, 'usage', {})}
+        else:
+            raise ValueError(f"Action {action} not supported.")
+
+    def generate(self, text: str, cwd: str = None, no_cache: bool = False):
+        """
+        generate: generate the command in the caller's working directory.
+        Args:
+            text: the text to be converted into a command.
+            cwd: the working directory of the caller.
+            no_cache: if True, always generate the command from LLM.
+        """
+        from termax.cli.utils import generate_command, get_result_cache, get_cache_key
+
+        # the memory may be cleared by `t rag --clear` in another process.
+        self.memory.refresh()
+        if cwd:
+            os.chdir(cwd)
+
+        # the commands are only cached once executed successfully, the plugins never execute them here.
+        config_dict = Config().read()
+        command = None if no_cache else get_result_cache(config_dict).get(get_cache_key(text, config_dict))
+        if command is None:
+            model, _ = self.load_model()
+            self.prompt.path_metadata['current_directory'] = os.getcwd()
+            command = generate_command(model, self.prompt, text)
+
+        return command
+
+    def service_actions(self):
+        """
+        service_actions: flush the journal of the saved commands periodically, between the requests.
+        """
+        from termax.prompt import flush_journal
+        from termax.cli.utils import get_storage_size
+
+        if time.monotonic() - self.flushed_at < JOURNAL_FLUSH_INTERVAL:
+            return
+        self.flushed_at = time.monotonic()
+        try:
+            self.memory.refresh()
+            flush_journal(self.memory, get_storage_size(Config().read()))
+        except Exception as e:
+            click.echo(f"Failed to flush the journal: {e}", err=True)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def remove_stale_socket(socket_path: str):
+    """
+    remove_stale_socket: remove the socket file left by a dead daemon.
+    Args:
+        socket_path: the path of the Unix domain socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+            return
+
+    raise RuntimeError(f"termaxd is already running on {socket_path}.")
+
+
+@click.command()
+@click.option('--socket', '-s', 'socket_path', type=str, default=os.path.join(CONFIG_HOME, DAEMON_SOCKET),
+              help="Path of the Unix domain socket.")
+def main(socket_path: str):
+    """
+    termaxd: serve the Termax shell plugins from a resident process.
+    """
+    # avoid the tokenizers parallelism issue
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+    server = TermaxDaemon(socket_path)
+    click.echo(f"termaxd is listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -7,7 +7,7 @@ _termax_bash() {
         { spin 5 & } 2>/dev/null
         SPIN_PID=$!
 
-        READLINE_LINE=$(t termax -p "$_termax_prev_line")
+        READLINE_LINE=$(termaxc "$_termax_prev_line")
         kill "$SPIN_PID"
         printf "\r%s" "                 "
         echo " "
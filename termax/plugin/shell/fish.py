@@ -3,7 +3,7 @@ fish_function = """
 function termax_fish
     set -l _buffer (commandline)
     if test -n "$_buffer"
-        t termax -p "$_buffer" > /tmp/termax_output.txt &
+        termaxc "$_buffer" > /tmp/termax_output.txt &
         set -l job_id $last_pid
         while kill -0 $job_id 2>/dev/null
             commandline -a "."
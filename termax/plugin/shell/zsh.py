@@ -12,7 +12,7 @@ _termax_zsh() {
 
         # Start termax in the background and redirect its output to the temporary file
         set +m
-        t termax -p "$_termax_prev_cmd" > "$tmpfile" &
+        termaxc "$_termax_prev_cmd" > "$tmpfile" &
         pid=$!
 
         # Spinner
@@ -1,3 +1,7 @@
 from .prompt import *
 from .utils import *
 from .memory import *
+from .embedding import *
+from .lexical import *
+from .journal import *
+from .snapshot import *
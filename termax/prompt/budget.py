@@ -0,0 +1,60 @@
+from termax.utils.const import *
+from termax.utils.tokens import count_tokens
+
+
+def get_context_size(model_name: str = None):
+    """
+    get_context_size: get the context size of a model, matched by the longest known prefix of its name.
+    Args:
+        model_name: the name of the model, e.g. `gpt-3.5-turbo`.
+
+    Returns: the context size in tokens.
+    """
+    if not model_name:
+        return DEFAULT_CONTEXT_SIZE
+
+    model_name = model_name.lower()
+    matches = [prefix for prefix in MODEL_CONTEXT_SIZES if model_name.startswith(prefix.lower())]
+    return MODEL_CONTEXT_SIZES[max(matches, key=len)] if matches else DEFAULT_CONTEXT_SIZE
+
+
+class TokenBudget:
+    """
+    TokenBudget: fit the prompt sections into a token budget, trimming the sections by priority.
+    """
+
+    def __init__(self, model_name: str = None, target: int = PROMPT_TOKEN_TARGET):
+        """
+        Args:
+            model_name: the name of the model, used to look up the context size.
+            target: the target size of the prompt in tokens, capped by the context size of the model.
+        """
+        self.context_size = get_context_size(model_name)
+        # leave room in the context for the user's input and the response.
+        self.target = min(target, self.context_size - PROMPT_RESPONSE_RESERVE)
+
+    def fit(self, fixed: dict, sections: dict, trim_order: list = PROMPT_TRIM_ORDER):
+        """
+        fit: trim the items of the sections until the prompt fits the target.
+        Args:
+            fixed: the parts which are never trimmed, a dictionary of the name and the text.
+            sections: the trimmable sections, a dictionary of the name and a list of items, the most important first.
+            trim_order: the order to trim the sections, the first is trimmed first.
+
+        Returns: a tuple of (the kept items of each section, the token breakdown of each section).
+        """
+        breakdown = {name: count_tokens(text) for name, text in fixed.items()}
+        counts = {name: [count_tokens(str(item)) + 1 for item in items] for name, items in sections.items()}
+        kept = {name: len(items) for name, items in sections.items()}
+
+        total = sum(breakdown.values()) + sum(sum(items) for items in counts.values())
+        for name in trim_order + [name for name in sections if name not in trim_order]:
+            while total > self.target and kept.get(name):
+                kept[name] -= 1
+                total -= counts[name][kept[name]]
+
+        for name in sections:
+            breakdown[name] = sum(counts[name][:kept[name]])
+        breakdown['total'] = total
+
+        return {name: items[:kept[name]] for name, items in sections.items()}, breakdown
@@ -0,0 +1,206 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List
+
+from termax.utils.const import *
+from termax.utils.cache import get_cache_path
+from termax.utils.tokens import normalize_text
+
+
+class EmbeddingCache:
+    """
+    EmbeddingCache: an on-disk LRU cache of the embeddings, keyed by the embedding model and the normalized text.
+    """
+
+    def __init__(self, path: str = None, size: int = EMBEDDING_CACHE_SIZE):
+        """
+        Args:
+            path: the path of the SQLite database, default is under the Termax cache directory.
+            size: the maximum number of embeddings, the least recently used ones are evicted.
+        """
+        self.path = path or get_cache_path(CACHE_EMBEDDINGS, 'sqlite3')
+        self.size = size
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def connect(self):
+        """
+        connect: open a connection, the cache is shared by the threads and the processes.
+        """
+        return sqlite3.connect(self.path, timeout=5)
+
+    @staticmethod
+    def make_key(model_name: str, text: str):
+        """
+        make_key: the cache key of a text.
+        Args:
+            model_name: the name of the embedding model.
+            text: the text to embed.
+        """
+        return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]):
+        """
+        get_many: get the cached embeddings and mark them as recently used.
+        Args:
+            keys: the cache keys.
+
+        Returns: a dictionary of the key and the embedding, the missing keys are absent.
+        """
+        if not keys:
+            return {}
+
+        with self.connect() as connection:
+            rows = connection.execute(
+                f"SELECT key, embedding FROM embeddings WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            now = time.time()
+            connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows])
+
+        return {key: array('f', embedding).tolist() for key, embedding in rows}
+
+    def set_many(self, embeddings: dict):
+        """
+        set_many: cache the embeddings, then evict the least recently used ones beyond the size.
+        Args:
+            embeddings: a dictionary of the key and the embedding.
+        """
+        if not embeddings:
+            return
+
+        now = time.time()
+        with self.connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [(key, array('f', embedding).tobytes(), now) for key, embedding in embeddings.items()]
+            )
+            overflow = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.size
+            if overflow > 0:
+                connection.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,)
+                )
+
+
+class CachedEmbeddingFunction:
+    """
+    CachedEmbeddingFunction: a ChromaDB embedding function, only the texts missing in the cache are embedded.
+    """
+
+    def __init__(self, embedding_function, model_name: str, cache: EmbeddingCache = None):
+        """
+        Args:
+            embedding_function: the underlying ChromaDB embedding function, or a function to create it, which is
+             only called on the first cache miss.
+            model_name: the name of the embedding model, the embeddings of different models never mix.
+            cache: the embedding cache, default is the cache under the Termax home.
+        """
+        self.embedding_function = None if isinstance(embedding_function, EmbeddingFactory) else embedding_function
+        self.factory = embedding_function
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+        # the model is called by one thread at a time, the callers wait for the warm up.
+        self.lock = threading.Lock()
+        self.warming = None
+
+    @property
+    def loading(self):
+        """
+        loading: True while the model is being warmed up in the background.
+        """
+        return self.warming is not None and self.warming.is_alive()
+
+    def warm_up(self):
+        """
+        warm_up: load the default model in the background by embedding a text, e.g. when the daemon starts.
+        The OpenAI models need no loading, they are skipped.
+        """
+        if self.model_name != DEFAULT_EMBEDDING_MODEL or self.warming is not None:
+            return
+
+        def load():
+            try:
+                with self.lock:
+                    if self.embedding_function is None:
+                        self.embedding_function = self.factory()
+                    self.embedding_function([self.model_name])
+            except Exception:
+                # e.g. offline, the model is loaded again by the next call.
+                pass
+
+        self.warming = threading.Thread(target=load, daemon=True)
+        self.warming.start()
+
+    def cached(self, input):
+        """
+        cached: check all the texts are in the cache, so that they are embedded without the model.
+        Args:
+            input: the texts to embed.
+        """
+        keys = list({EmbeddingCache.make_key(self.model_name, text) for text in input})
+        try:
+            return len(self.cache.get_many(keys)) == len(keys)
+        except sqlite3.Error:
+            return False
+
+    def __call__(self, input):
+        """
+        Args:
+            input: the texts to embed.
+
+        Returns: the embeddings of the texts, in the same order.
+        """
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in input]
+        try:
+            embeddings = self.cache.get_many(list(set(keys)))
+        except sqlite3.Error:
+            embeddings = {}
+
+        missing = list(dict.fromkeys(key for key in keys if key not in embeddings))
+        if missing:
+            texts = {key: text for key, text in zip(keys, input)}
+            with self.lock:
+                if self.embedding_function is None:
+                    self.embedding_function = self.factory()
+                computed = dict(zip(missing, self.embedding_function([texts[key] for key in missing])))
+            embeddings.update(computed)
+            try:
+                self.cache.set_many(computed)
+            except sqlite3.Error:
+                # the cache is an optimization only, the embeddings are still returned.
+                pass
+
+        return [list(embeddings[key]) for key in keys]
+
+
+class EmbeddingFactory:
+    """
+    EmbeddingFactory: create the ChromaDB embedding function on demand, importing ChromaDB is slow.
+    """
+
+    def __init__(self, api_key: str = None, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        """
+        Args:
+            api_key: the OpenAI API key, required by the OpenAI embedding models.
+            model_name: the name of the embedding model, the default embedding model of ChromaDB or an OpenAI one.
+        """
+        self.api_key = api_key
+        self.model_name = model_name
+
+    def __call__(self):
+        from chromadb.utils import embedding_functions
+
+        if self.model_name == DEFAULT_EMBEDDING_MODEL:
+            return embedding_functions.DefaultEmbeddingFunction()
+        if not self.api_key:
+            raise ValueError(f"The embedding model {self.model_name} requires the OpenAI API key.")
+        return embedding_functions.OpenAIEmbeddingFunction(model_name=self.model_name, api_key=self.api_key)
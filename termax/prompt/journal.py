@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import contextlib
+from datetime import datetime
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+
+
+def get_journal_path(data_path: str = CONFIG_HOME):
+    """
+    get_journal_path: get the path of the write-behind journal of the memory.
+    Args:
+        data_path: the path to store the data.
+    """
+    return os.path.join(data_path, JOURNAL_FILE)
+
+
+def append_journal(query: str, response: str, metadata: dict = None, data_path: str = CONFIG_HOME):
+    """
+    append_journal: append a record to the journal, it is only a small append, the memory is not touched.
+    Args:
+        query: the query of the record.
+        response: the response of the record.
+        metadata: the extra metadata of the record, e.g. the project.
+        data_path: the path to store the data.
+    """
+    line = json.dumps({'query': query, 'response': response, 'metadata': metadata or {}, 'ts': time.time()}) + '\n'
+    os.makedirs(data_path, exist_ok=True)
+    # a single write in the append mode, the concurrent writers never interleave the lines.
+    fd = os.open(get_journal_path(data_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def journal_lock(data_path: str = CONFIG_HOME):
+    """
+    journal_lock: hold an exclusive lock while flushing the journal, so that a journal is flushed only once.
+
+    Returns: True if the lock is held, False if another process is flushing.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # no advisory locks on Windows, the flush is idempotent except for the hit counts.
+        yield True
+        return
+
+    with open(get_journal_path(data_path) + '.lock', 'w') as file:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def read_journal(path: str):
+    """
+    read_journal: read the records of a journal, the partial last line of an interrupted append is skipped.
+    Args:
+        path: the path of the journal.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def read_applied(path: str):
+    """
+    read_applied: read the number of the records of a flushing journal already added to the memory.
+    Args:
+        path: the path of the checkpoint.
+    """
+    try:
+        with open(path, 'r') as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return 0
+
+
+def write_applied(path: str, applied: int):
+    """
+    write_applied: checkpoint the number of the records added to the memory, atomically.
+    Args:
+        path: the path of the checkpoint.
+        applied: the number of the added records.
+    """
+    with open(path + '.tmp', 'w') as file:
+        file.write(str(applied))
+    os.replace(path + '.tmp', path)
+
+
+def flush_journal(memory, max_size: int = None, data_path: str = CONFIG_HOME):
+    """
+    flush_journal: move the journal aside and add its records to the memory in batches.
+    The journal is renamed before flushing, the new records are appended to a new journal meanwhile.
+    The number of the added records is checkpointed after each batch, if a flush is interrupted, the renamed journal
+    is replayed by the next flush from the checkpoint, so that no hit is counted twice.
+    Args:
+        memory: the memory instance.
+        max_size: the storage size, the least used records are evicted after the flush.
+        data_path: the path to store the data.
+
+    Returns: the number of flushed records.
+    """
+    path = get_journal_path(data_path)
+    flushing_path = path + '.flushing'
+    applied_path = flushing_path + '.applied'
+    if not os.path.exists(path) and not os.path.exists(flushing_path):
+        return 0
+
+    with journal_lock(data_path) as locked:
+        if not locked:
+            return 0
+
+        flushed = 0
+        # replay the journal of an interrupted flush first, then the current journal.
+        for replay in (True, False):
+            if not replay:
+                try:
+                    os.replace(path, flushing_path)
+                except FileNotFoundError:
+                    break
+            if not os.path.exists(flushing_path):
+                # the checkpoint of a completed flush, left if it was interrupted right before removing it.
+                if os.path.exists(applied_path):
+                    os.remove(applied_path)
+                continue
+
+            records = read_journal(flushing_path)
+            applied = read_applied(applied_path) if replay else 0
+            for start in range(applied, len(records), JOURNAL_BATCH_SIZE):
+                # the repeats of a record in a batch are aggregated by `add_query`, each counts a hit.
+                memory.add_query([
+                    {
+                        **record.get('metadata', {}),
+                        # the records are dated when they were saved, not when they are flushed.
+                        **({'created_at': datetime.fromtimestamp(record['ts']).isoformat(),
+                            'created_ts': record['ts'], 'last_used_at': record['ts']} if 'ts' in record else {}),
+                        'query': record['query'],
+                        'response': record['response']
+                    } for record in records[start:start + JOURNAL_BATCH_SIZE]
+                ])
+                write_applied(applied_path, min(start + JOURNAL_BATCH_SIZE, len(records)))
+            flushed += len(records) - applied
+            os.remove(flushing_path)
+            if os.path.exists(applied_path):
+                os.remove(applied_path)
+
+        if flushed and max_size is not None:
+            memory.evict(max_size)
+
+    return flushed
@@ -0,0 +1,153 @@
+import os
+import math
+import sqlite3
+from collections import Counter
+from typing import List
+
+from termax.utils.const import *
+from termax.utils.tokens import split_terms
+
+
+class LexicalIndex:
+    """
+    LexicalIndex: an inverted index of the queries and the responses in SQLite, ranked by BM25.
+    It needs no embedding model, and matches the exact keywords, e.g. the command and the file names.
+    """
+
+    def __init__(self, path: str, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            path: the path of the SQLite database.
+            k1: the term frequency saturation of BM25.
+            b: the length normalization of BM25.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents "
+                "(collection TEXT NOT NULL, id TEXT NOT NULL, length INTEGER NOT NULL, PRIMARY KEY (collection, id))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS postings "
+                "(collection TEXT NOT NULL, term TEXT NOT NULL, id TEXT NOT NULL, frequency INTEGER NOT NULL, "
+                "PRIMARY KEY (collection, term, id))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (collection, id)")
+            if connection.execute("PRAGMA user_version").fetchone()[0] < LEXICAL_INDEX_VERSION:
+                # the terms of an older version are dropped, the collections are indexed again by `sync_lexical`.
+                connection.execute("DELETE FROM documents")
+                connection.execute("DELETE FROM postings")
+                connection.execute(f"PRAGMA user_version = {LEXICAL_INDEX_VERSION}")
+
+    def connect(self):
+        """
+        connect: open a connection, the index is shared by the processes.
+        """
+        return sqlite3.connect(self.path, timeout=5)
+
+    def add(self, ids: List[str], texts: List[str], collection: str = DB_COMMAND_HISTORY):
+        """
+        add: index the texts, the existing documents of the same ids are replaced.
+        Args:
+            ids: the ids of the documents.
+            texts: the texts to index, e.g. the query and the response of each record.
+            collection: the name of the collection.
+        """
+        if not ids:
+            return
+
+        documents = {record_id: Counter(split_terms(text)) for record_id, text in zip(ids, texts)}
+        with self.connect() as connection:
+            self.remove(connection, list(documents), collection)
+            connection.executemany(
+                "INSERT INTO documents (collection, id, length) VALUES (?, ?, ?)",
+                [(collection, record_id, sum(terms.values())) for record_id, terms in documents.items()]
+            )
+            connection.executemany(
+                "INSERT INTO postings (collection, term, id, frequency) VALUES (?, ?, ?, ?)",
+                [
+                    (collection, term, record_id, frequency)
+                    for record_id, terms in documents.items() for term, frequency in terms.items()
+                ]
+            )
+
+    def delete(self, ids: List[str] = None, collection: str = DB_COMMAND_HISTORY):
+        """
+        delete: remove the documents from the index.
+        Args:
+            ids: the ids of the documents, all the documents of the collection if not set.
+            collection: the name of the collection, all the collections if None.
+        """
+        with self.connect() as connection:
+            if ids is not None:
+                self.remove(connection, ids, collection)
+            elif collection is not None:
+                connection.execute("DELETE FROM documents WHERE collection = ?", (collection,))
+                connection.execute("DELETE FROM postings WHERE collection = ?", (collection,))
+            else:
+                connection.execute("DELETE FROM documents")
+                connection.execute("DELETE FROM postings")
+
+    @staticmethod
+    def remove(connection: sqlite3.Connection, ids: List[str], collection: str):
+        rows = [(collection, record_id) for record_id in ids]
+        connection.executemany("DELETE FROM documents WHERE collection = ? AND id = ?", rows)
+        connection.executemany("DELETE FROM postings WHERE collection = ? AND id = ?", rows)
+
+    def count(self, collection: str = DB_COMMAND_HISTORY):
+        """
+        count: count the indexed documents.
+        Args:
+            collection: the name of the collection.
+        """
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+
+    def search(self, text: str, collection: str = DB_COMMAND_HISTORY, n_results: int = 5):
+        """
+        search: rank the documents by their BM25 scores against the text.
+        Args:
+            text: the text to search.
+            collection: the name of the collection.
+            n_results: the number of results to return.
+
+        Returns: a list of the id and the score, the highest scores come first, the unmatched documents are absent.
+        """
+        terms = list(dict.fromkeys(split_terms(text)))
+        if not terms:
+            return []
+
+        marks = ','.join('?' * len(terms))
+        with self.connect() as connection:
+            total, average_length = connection.execute(
+                "SELECT COUNT(*), AVG(length) FROM documents WHERE collection = ?", (collection,)
+            ).fetchone()
+            if not total:
+                return []
+
+            frequencies = dict(connection.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE collection = ? AND term IN ({marks}) GROUP BY term",
+                (collection, *terms)
+            ).fetchall())
+            postings = connection.execute(
+                f"SELECT postings.id, postings.term, postings.frequency, documents.length FROM postings "
+                f"JOIN documents ON documents.collection = postings.collection AND documents.id = postings.id "
+                f"WHERE postings.collection = ? AND postings.term IN ({marks})",
+                (collection, *terms)
+            ).fetchall()
+
+        idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in frequencies.items()
+        }
+        scores = Counter()
+        for record_id, term, frequency, length in postings:
+            norm = self.k1 * (1 - self.b + self.b * length / (average_length or 1))
+            scores[record_id] += idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return scores.most_common(n_results)
@@ -1,15 +1,15 @@
-import uuid
+import math
+import hashlib
 import os.path
 from typing import List, Dict
 
-import chromadb
-from chromadb.utils import embedding_functions
-
-chromadb.logger.setLevel(chromadb.logging.ERROR)
-
+from .embedding import CachedEmbeddingFunction, EmbeddingFactory
+from .lexical import LexicalIndex
+from .vector_store import FlatClient
 from termax.utils.const import *
 from termax.utils.metadata import *
 from termax.utils import Config, CONFIG_HOME
+from termax.utils.tokens import normalize_text
 
 
 class Memory:
@@ -27,25 +27,150 @@ class Memory:
              "text-embedding-ada-002".
         """
         self.config = Config().read()
-        self.client = chromadb.PersistentClient(path=os.path.join(data_path, DB_PATH))
+        self.backend = self.config.get(CONFIG_SEC_GENERAL, {}).get('memory_backend', MEMORY_BACKEND_CHROMADB)
+        if self.backend == MEMORY_BACKEND_FLAT:
+            self.client = FlatClient(os.path.join(data_path, DB_VECTOR_PATH))
+        elif self.backend == MEMORY_BACKEND_CHROMADB:
+            # chromadb is heavy to import, only load it when the memory is actually used.
+            import chromadb
+            chromadb.logger.setLevel(chromadb.logging.ERROR)
+            self.client = chromadb.PersistentClient(path=os.path.join(data_path, DB_PATH))
+        else:
+            raise ValueError(f"Memory backend {self.backend} not supported, should be one of {MEMORY_BACKENDS}.")
 
-        # use the OpenAI embedding function if the openai section is set in the configuration.
+        # use the OpenAI embedding model if the openai section is set in the configuration.
         if self.config.get(CONFIG_SEC_OPENAI, None):
-            self.client.get_or_create_collection(
-                DB_COMMAND_HISTORY,
-                embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-                    model_name=embedding_model,
-                    api_key=self.config[CONFIG_SEC_OPENAI][CONFIG_SEC_API_KEY]
-                )
-            )
+            self.api_key = self.config[CONFIG_SEC_OPENAI][CONFIG_SEC_API_KEY]
+            self.embedding_model = embedding_model
         else:
-            self.client.get_or_create_collection(DB_COMMAND_HISTORY)
+            self.api_key = None
+            self.embedding_model = DEFAULT_EMBEDDING_MODEL
+
+        self.embedding_functions = {}
+        self.embedding_function = None
+        # the collection handles are cached, and invalidated once the collections are deleted.
+        self.collections = {}
+        self.collection(DB_COMMAND_HISTORY)
+
+        # the keyword index is kept next to the vectors, it serves the queries without the embedding model.
+        self.lexical = LexicalIndex(os.path.join(data_path, LEXICAL_INDEX_PATH))
+        self.lexical_synced = set()
+        self.retrieval = self.config.get(CONFIG_SEC_GENERAL, {}).get('retrieval_mode', RETRIEVAL_HYBRID)
+        if self.retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Retrieval mode {self.retrieval} not supported, should be one of {RETRIEVAL_MODES}.")
+
+    def get_embedding_function(self, model_name: str):
+        """
+        get_embedding_function: get the embedding function of a model.
+        The embeddings are cached on disk, the repeated texts never hit the embedding model again,
+        and the embedding model is only loaded on the first cache miss.
+        Args:
+            model_name: the name of the embedding model.
+        """
+        if model_name not in self.embedding_functions:
+            self.embedding_functions[model_name] = CachedEmbeddingFunction(
+                EmbeddingFactory(self.api_key, model_name), model_name
+            )
+        return self.embedding_functions[model_name]
+
+    def get_collection_model(self, handle):
+        """
+        get_collection_model: the embedding model of the records in a collection.
+        Args:
+            handle: the collection, None if it does not exist yet.
+
+        Returns: the recorded model, the configured model for a new or empty collection.
+        """
+        if handle is None:
+            return self.embedding_model
+
+        model_name = (handle.metadata or {}).get(COLLECTION_EMBEDDING_MODEL)
+        if model_name:
+            return model_name
+
+        # the model was not recorded by the older versions, the dimension tells the default model of ChromaDB.
+        embeddings = handle.peek(1)['embeddings']
+        if embeddings is None or not len(embeddings):
+            return self.embedding_model
+        return DEFAULT_EMBEDDING_MODEL if len(embeddings[0]) == DEFAULT_EMBEDDING_DIM else self.embedding_model
+
+    def collection(self, name: str = DB_COMMAND_HISTORY, validate: bool = False):
+        """
+        collection: get the cached handle of a collection, create the collection if it does not exist.
+        The collection is embedded by the model it was built with, even if another model is configured later.
+        Args:
+            name: the name of the collection.
+            validate: if True, reopen the cached handle if the collection was deleted by another process,
+             it is required before writing.
+        """
+        handle = self.collections.get(name)
+        if validate and handle is not None and not self.is_current(name, handle):
+            del self.collections[name]
+            self.lexical_synced.discard(name)
+
+        if name not in self.collections:
+            try:
+                handle = self.client.get_collection(name)
+            except ValueError:
+                handle = None
+
+            model_name = self.get_collection_model(handle)
+            self.collections[name] = self.client.get_or_create_collection(
+                name,
+                metadata={**((handle.metadata or {}) if handle is not None else {}),
+                          COLLECTION_EMBEDDING_MODEL: model_name},
+                embedding_function=self.get_embedding_function(model_name)
+            )
+            if name == DB_COMMAND_HISTORY:
+                # the command history keeps the model it was built with, the vectors of different models never mix.
+                self.embedding_function = self.get_embedding_function(model_name)
+        return self.collections[name]
+
+    def set_collection_model(self, model_name: str, name: str = DB_COMMAND_HISTORY):
+        """
+        set_collection_model: switch an empty collection to another embedding model, e.g. the model of a snapshot.
+        Args:
+            model_name: the name of the embedding model.
+            name: the name of the collection.
+        """
+        handle = self.collection(name, validate=True)
+        if handle.count():
+            raise ValueError(f"The collection {name} is not empty, its embedding model can not be changed.")
+
+        handle.modify(metadata={**(handle.metadata or {}), COLLECTION_EMBEDDING_MODEL: model_name})
+        # reopen the collection with the embedding function of the model.
+        del self.collections[name]
+        return self.collection(name)
+
+    def is_current(self, name: str, handle):
+        """
+        is_current: check a cached handle still refers to the collection, e.g. not deleted by `t rag --clear`.
+        Args:
+            name: the name of the collection.
+            handle: the cached handle.
+        """
+        if self.backend == MEMORY_BACKEND_FLAT:
+            # the flat collections reload themselves once changed on disk, the handles never go stale.
+            return True
+
+        try:
+            return self.client.get_collection(name).id == handle.id
+        except ValueError:
+            return False
+
+    def refresh(self):
+        """
+        refresh: reopen the cached handles of the collections deleted by other processes, e.g. in the daemon.
+        """
+        for name in list(self.collections):
+            self.collection(name, validate=True)
 
     def add_query(
             self,
             queries: List[Dict[str, str]],
             collection: str = DB_COMMAND_HISTORY,
-            idx: List[str] = None
+            idx: List[str] = None,
+            embeddings: List[List[float]] = None
     ):
         """
         add_query: add the queries to the memery.
@@ -55,40 +180,449 @@ class Memory:
                     "query": "the query",
                     "response": "the response"
                 }
+                the other keys are stored in the metadata, overriding the defaults.
             collection: the name of the collection to add the queries.
             idx: the ids of the queries, should be in the same length as the queries.
-            If not provided, the ids will be generated by UUID.
+            If not provided, the ids are the hashes of the queries and the responses, a repeated query and response
+            counts a hit of the existing record instead of adding a duplicate.
+            embeddings: the precomputed embeddings of the queries, computed by the embedding function if not provided.
 
         Return: A list of generated IDs.
         """
         if idx:
             ids = idx
         else:
-            ids = [str(uuid.uuid4()) for _ in range(len(queries))]
+            ids = [make_record_id(query['query'], query['response']) for query in queries]
+
+        # upsert: each repeat of a record counts a hit, only the first occurrence of a new record is embedded and added.
+        # the handle is validated once for the whole batch.
+        self.collection(collection, validate=True)
+        existing = self.existing_ids(ids, collection)
+        occurrences = {}
+        for i, record_id in enumerate(ids):
+            occurrences.setdefault(record_id, []).append(i)
+
+        now = datetime.now()
+
+        def last_used_at(record_id: str):
+            return max(queries[i].get('last_used_at', now.timestamp()) for i in occurrences[record_id])
 
-        query_list = [query['query'] for query in queries]
-        added_time = datetime.now().isoformat()
-        resp_list = [{'response': query['response'], 'created_at': added_time} for query in queries]
+        def last_project(record_id: str):
+            # a record belongs to the project where it was used last, e.g. the same command saved in another project.
+            query = queries[occurrences[record_id][-1]]
+            return {key: query[key] for key in PROJECT_METADATA_KEYS if key in query}
+
+        reused = [record_id for record_id in occurrences if record_id in existing]
+        self.record_hits(
+            reused, collection, validate=False,
+            counts=[len(occurrences[record_id]) for record_id in reused],
+            used_at=[last_used_at(record_id) for record_id in reused],
+            metadatas=[last_project(record_id) for record_id in reused]
+        )
+        new = [occurrences[record_id][0] for record_id in occurrences if record_id not in existing]
+        if not new:
+            return ids
+
+        resp_list = []
+        for i in new:
+            metadata = {
+                'response': queries[i]['response'],
+                'created_at': now.isoformat(),
+                'created_ts': now.timestamp(),
+                'last_used_at': now.timestamp(),
+                'hit_count': 0,
+                **{key: value for key, value in queries[i].items() if key not in ('query', 'response')}
+            }
+            # the repeats of a new record in the same batch are its hits.
+            metadata['hit_count'] += len(occurrences[ids[i]]) - 1
+            metadata['last_used_at'] = max(metadata['last_used_at'], last_used_at(ids[i]))
+            metadata.update(last_project(ids[i]))
+            resp_list.append(metadata)
+        query_list = [queries[i]['query'] for i in new]
+        embeddings = [embeddings[i] for i in new] if embeddings is not None else None
         # insert the record into the database
-        self.client.get_or_create_collection(collection).add(
+        self.collection(collection).add(
             documents=query_list,
             metadatas=resp_list,
-            ids=ids
+            embeddings=embeddings,
+            ids=[ids[i] for i in new]
+        )
+        self.lexical.add(
+            [ids[i] for i in new], [f"{queries[i]['query']} {queries[i]['response']}" for i in new], collection
         )
 
         return ids
 
-    def query(self, query_texts: List[str], collection: str = DB_COMMAND_HISTORY, n_results: int = 5):
+    def query(
+            self,
+            query_texts: List[str],
+            collection: str = DB_COMMAND_HISTORY,
+            n_results: int = 5,
+            hit_weight: float = RANK_HIT_WEIGHT,
+            where: dict = None
+    ):
         """
-        query: query the memery.
+        query: query the memery, the frequently reused records are ranked higher.
         Args:
             query_texts: the query texts to search in the memery.
             collection: the name of the collection to search, default is the command history.
             n_results: the number of results to return.
+            hit_weight: the weight of the hits in the ranking, the score is `distance - weight * log(1 + hits)`.
+             The distances are returned as they are, 0 to rank by the distance only.
+            where: the filter on the metadata, the records are filtered before they are ranked.
 
         Returns: the top k results.
         """
-        return self.client.get_or_create_collection(collection).query(query_texts=query_texts, n_results=n_results)
+        if not hit_weight:
+            return self.collection(collection).query(query_texts=query_texts, n_results=n_results, where=where)
+
+        # fetch more candidates than required, then rerank them by the blended score.
+        results = self.collection(collection).query(
+            query_texts=query_texts, n_results=n_results * RANK_CANDIDATES, where=where
+        )
+        for i in range(len(query_texts)):
+            order = sorted(
+                range(len(results['ids'][i])),
+                key=lambda j: results['distances'][i][j] - hit_weight * math.log1p(
+                    (results['metadatas'][i][j] or {}).get('hit_count', 0))
+            )[:n_results]
+            for key in ('ids', 'documents', 'metadatas', 'distances', 'embeddings'):
+                if results.get(key) is not None:
+                    results[key][i] = [results[key][i][j] for j in order]
+
+        return results
+
+    def query_lexical(
+            self,
+            query_texts: List[str],
+            collection: str = DB_COMMAND_HISTORY,
+            n_results: int = 5,
+            where: dict = None
+    ):
+        """
+        query_lexical: query the memery by the keywords only, no embedding model is loaded.
+        Args:
+            query_texts: the query texts to search in the memery.
+            collection: the name of the collection to search, default is the command history.
+            n_results: the number of results to return.
+            where: the filter on the metadata, applied to the matched records.
+
+        Returns: the top k results in the same format as `query`, with the BM25 `scores` instead of the distances.
+        """
+        self.sync_lexical(collection)
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'scores': []}
+        for text in query_texts:
+            # the index has no metadata, more matches are fetched to fill the results after the filter.
+            ranked = self.lexical.search(text, collection, n_results * RANK_CANDIDATES if where else n_results)
+            records = self.collection(collection).get(
+                ids=[record_id for record_id, _ in ranked], where=where, include=['documents', 'metadatas']
+            ) if ranked else {'ids': []}
+            found = {
+                record_id: (document, metadata)
+                for record_id, document, metadata in zip(records['ids'], records.get('documents') or [],
+                                                         records.get('metadatas') or [])
+            }
+            ranked = [(record_id, score) for record_id, score in ranked if record_id in found][:n_results]
+            results['ids'].append([record_id for record_id, _ in ranked])
+            results['documents'].append([found[record_id][0] for record_id, _ in ranked])
+            results['metadatas'].append([found[record_id][1] for record_id, _ in ranked])
+            results['distances'].append([None] * len(ranked))
+            results['scores'].append([score for _, score in ranked])
+
+        return results
+
+    def search(
+            self,
+            query_texts: List[str],
+            collection: str = DB_COMMAND_HISTORY,
+            n_results: int = 5,
+            mode: str = None,
+            where: dict = None,
+            project_id: str = None
+    ):
+        """
+        search: query the memery by the configured retrieval mode.
+        The hybrid mode fuses the vector and the BM25 rankings by the reciprocal rank fusion, and falls back to the
+        keywords only if the embedding model is not available, e.g. offline, or still being loaded.
+        Args:
+            query_texts: the query texts to search in the memery.
+            collection: the name of the collection to search, default is the command history.
+            n_results: the number of results to return.
+            mode: `hybrid`, `vector` or `lexical`, default is the `retrieval_mode` in the configuration.
+            where: the filter on the metadata.
+            project_id: the current project, its records are searched first, and the results of all the projects
+             fill the rest.
+
+        Returns: the top k results in the same format as `query`, with the fused `scores`, the distances of the
+         records only found by the keywords are None.
+        """
+        if project_id:
+            return self.search_project(query_texts, project_id, collection, n_results, mode)
+
+        mode = mode or self.retrieval
+        if mode == RETRIEVAL_LEXICAL:
+            return self.query_lexical(query_texts, collection, n_results, where=where)
+        if mode == RETRIEVAL_VECTOR:
+            return self.query(query_texts, collection, n_results, where=where)
+
+        lexical = self.query_lexical(query_texts, collection, n_results * RANK_CANDIDATES, where=where)
+        vector = None
+        function = self.get_embedding_function(
+            (self.collection(collection).metadata or {}).get(COLLECTION_EMBEDDING_MODEL, self.embedding_model)
+        )
+        # never wait for the model being loaded, unless the query texts are already embedded.
+        if not function.loading or function.cached(query_texts):
+            try:
+                vector = self.query(query_texts, collection, n_results * RANK_CANDIDATES, where=where)
+            except Exception:
+                pass
+        if vector is None:
+            for key in ('ids', 'documents', 'metadatas', 'distances', 'scores'):
+                lexical[key] = [values[:n_results] for values in lexical[key]]
+            return lexical
+
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'scores': []}
+        for i in range(len(query_texts)):
+            scores, records = {}, {}
+            for ranking, has_distance in ((vector, True), (lexical, False)):
+                for rank, record_id in enumerate(ranking['ids'][i]):
+                    scores[record_id] = scores.get(record_id, 0.0) + 1 / (RRF_K + rank + 1)
+                    if record_id not in records or has_distance:
+                        records[record_id] = (
+                            ranking['documents'][i][rank], ranking['metadatas'][i][rank],
+                            ranking['distances'][i][rank] if has_distance else None
+                        )
+
+            fused = sorted(scores, key=scores.get, reverse=True)[:n_results]
+            results['ids'].append(fused)
+            results['documents'].append([records[record_id][0] for record_id in fused])
+            results['metadatas'].append([records[record_id][1] for record_id in fused])
+            results['distances'].append([records[record_id][2] for record_id in fused])
+            results['scores'].append([scores[record_id] for record_id in fused])
+
+        return results
+
+    def search_project(
+            self,
+            query_texts: List[str],
+            project_id: str,
+            collection: str = DB_COMMAND_HISTORY,
+            n_results: int = 5,
+            mode: str = None
+    ):
+        """
+        search_project: search the records of a project, then fill the results from all the projects if there are
+        not enough, so that a new project still has samples.
+        Args:
+            query_texts: the query texts to search in the memery.
+            project_id: the ID of the project.
+            collection: the name of the collection to search, default is the command history.
+            n_results: the number of results to return.
+            mode: the retrieval mode, default is the `retrieval_mode` in the configuration.
+
+        Returns: the top k results in the same format as `search`, the records of the project come first.
+        """
+        try:
+            results = self.search(query_texts, collection, n_results, mode, where={'project_id': project_id})
+        except Exception:
+            # e.g. the index of the vector database can not return enough neighbours after the filter.
+            results = {key: [[] for _ in query_texts] for key in ('ids', 'documents', 'metadatas', 'distances')}
+        if all(len(ids) >= n_results for ids in results['ids']):
+            return results
+
+        fallback = self.search(query_texts, collection, n_results, mode)
+        keys = [key for key in ('ids', 'documents', 'metadatas', 'distances', 'scores')
+                if results.get(key) is not None and fallback.get(key) is not None]
+        for i in range(len(query_texts)):
+            scoped = set(results['ids'][i])
+            for j, record_id in enumerate(fallback['ids'][i]):
+                if len(results['ids'][i]) >= n_results:
+                    break
+                if record_id not in scoped:
+                    for key in keys:
+                        results[key][i].append(fallback[key][i][j])
+
+        return {key: results[key] for key in keys}
+
+    def sync_lexical(self, collection: str = DB_COMMAND_HISTORY):
+        """
+        sync_lexical: rebuild the keyword index of a collection if it is out of sync, e.g. the records were saved
+        before the index existed. It is checked once per collection.
+        Args:
+            collection: the name of the collection.
+        """
+        if collection in self.lexical_synced:
+            return
+
+        if self.lexical.count(collection) != self.collection(collection).count():
+            self.lexical.delete(collection=collection)
+            for page in self.iter_records(collection):
+                self.lexical.add(
+                    page['ids'],
+                    [f"{document} {(metadata or {}).get('response', '')}"
+                     for document, metadata in zip(page['documents'], page['metadatas'])],
+                    collection
+                )
+        self.lexical_synced.add(collection)
+
+    def upsert_records(
+            self,
+            ids: List[str],
+            documents: List[str],
+            metadatas: List[Dict],
+            embeddings: List[List[float]],
+            collection: str = DB_COMMAND_HISTORY
+    ):
+        """
+        upsert_records: write the records as they are, with their metadata and precomputed embeddings, e.g. from a
+        snapshot. Unlike `add_query`, the existing records are replaced instead of counting a hit.
+        Args:
+            ids: the ids of the records.
+            documents: the queries of the records.
+            metadatas: the metadata of the records, including the responses.
+            embeddings: the embeddings of the queries.
+            collection: the name of the collection.
+        """
+        handle = self.collection(collection, validate=True)
+        batch_size = self.client.max_batch_size
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            handle.upsert(
+                ids=ids[start:end], documents=documents[start:end], metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end]
+            )
+        self.lexical.add(
+            ids, [f"{document} {metadata.get('response', '')}" for document, metadata in zip(documents, metadatas)],
+            collection
+        )
+
+    def add_many(
+            self,
+            queries: List[Dict[str, str]],
+            collection: str = DB_COMMAND_HISTORY,
+            idx: List[str] = None
+    ):
+        """
+        add_many: add a large number of queries to the memery, in batches within the limit of the database.
+        Args:
+            queries: the queries to add to the memery, in the same format as `add_query`.
+            collection: the name of the collection to add the queries.
+            idx: the ids of the queries, the hashes of the queries and the responses if not provided.
+
+        Return: A list of generated IDs.
+        """
+        ids = idx or [make_record_id(query['query'], query['response']) for query in queries]
+        batch_size = self.client.max_batch_size
+        for start in range(0, len(queries), batch_size):
+            self.add_query(queries[start:start + batch_size], collection, ids[start:start + batch_size])
+
+        return ids
+
+    def query_many(self, query_texts: List[str], collection: str = DB_COMMAND_HISTORY, n_results: int = 5):
+        """
+        query_many: query the memery with many texts in a single pass, the texts are embedded together.
+        Args:
+            query_texts: the query texts to search in the memery.
+            collection: the name of the collection to search, default is the command history.
+            n_results: the number of results to return for each text.
+
+        Returns: a list of the top k results, one for each text, in the same format as `query`.
+        """
+        if not query_texts:
+            return []
+
+        results = self.query(query_texts, collection, n_results)
+        keys = [key for key in ('ids', 'documents', 'metadatas', 'distances') if results.get(key) is not None]
+        return [{key: [results[key][i]] for key in keys} for i in range(len(query_texts))]
+
+    def existing_ids(self, ids: List[str], collection: str = DB_COMMAND_HISTORY):
+        """
+        existing_ids: find the ids which are already in the memery.
+        Args:
+            ids: the ids to check.
+            collection: the name of the collection.
+
+        Returns: a set of the existing ids.
+        """
+        if not ids:
+            return set()
+        return set(self.collection(collection).get(ids=list(dict.fromkeys(ids)), include=[])['ids'])
+
+    def record_hits(
+            self,
+            ids: List[str],
+            collection: str = DB_COMMAND_HISTORY,
+            validate: bool = True,
+            counts: List[int] = None,
+            used_at: List[float] = None,
+            metadatas: List[Dict] = None
+    ):
+        """
+        record_hits: count the hits of the records, the frequently reused records survive the eviction.
+        Args:
+            ids: the ids of the reused records, unique.
+            collection: the name of the collection.
+            validate: if False, the handle was already validated by the caller in the same batch.
+            counts: the number of hits of each record, 1 each by default.
+            used_at: the timestamp of the last hit of each record, now by default, e.g. when it was saved.
+            metadatas: the metadata to update with the hits, e.g. the project where each record was used.
+        """
+        if not ids:
+            return
+
+        handle = self.collection(collection, validate=validate)
+        records = handle.get(ids=ids, include=['metadatas'])
+        now = datetime.now().timestamp()
+        counts = dict(zip(ids, counts or [1] * len(ids)))
+        used_at = dict(zip(ids, used_at or [now] * len(ids)))
+        updates = dict(zip(ids, metadatas or [{}] * len(ids)))
+        handle.update(
+            ids=records['ids'],
+            metadatas=[
+                {
+                    **metadata,
+                    **updates[record_id],
+                    'hit_count': metadata.get('hit_count', 0) + counts[record_id],
+                    # the replayed hits never move the last use backwards.
+                    'last_used_at': max(metadata.get('last_used_at', 0), used_at[record_id])
+                } for record_id, metadata in zip(records['ids'], records['metadatas'])
+            ]
+        )
+
+    def evict(
+            self,
+            max_size: int,
+            collection: str = DB_COMMAND_HISTORY,
+            low_watermark: float = EVICTION_LOW_WATERMARK,
+            batch_size: int = EVICTION_BATCH_SIZE
+    ):
+        """
+        evict: evict the least valuable records once the collection grows beyond the max size.
+        The records are scored by their last use, each hit adds a bonus, the lowest scores are evicted in batches
+        until the collection shrinks to the low watermark.
+        Args:
+            max_size: the high watermark, the maximum number of records.
+            collection: the name of the collection.
+            low_watermark: the ratio of the max size to keep after the eviction.
+            batch_size: the number of records to delete in one call.
+
+        Returns: the number of evicted records.
+        """
+        handle = self.collection(collection, validate=True)
+        count = handle.count()
+        if count <= max_size:
+            return 0
+
+        records = handle.get(include=['metadatas'])
+        scores = {
+            record_id: get_record_score(metadata) for record_id, metadata in zip(records['ids'], records['metadatas'])
+        }
+        evicted = sorted(scores, key=scores.get)[:count - int(max_size * low_watermark)]
+        for start in range(0, len(evicted), batch_size):
+            handle.delete(ids=evicted[start:start + batch_size])
+        self.lexical.delete(evicted, collection)
+
+        return len(evicted)
 
     def peek(self, collection: str = DB_COMMAND_HISTORY, n_results: int = 20):
         """
@@ -99,7 +633,7 @@ class Memory:
 
         Returns: the top k results.
         """
-        return self.client.get_or_create_collection(collection).peek(limit=n_results)
+        return self.collection(collection).peek(limit=n_results)
 
     def get(self, record_id: str = None, collection: str = DB_COMMAND_HISTORY):
         """
@@ -110,18 +644,61 @@ class Memory:
 
         Returns: the record.
         """
-        collection = self.client.get_collection(collection)
+        collection = self.collection(collection)
         if not record_id:
             return collection.get()
 
         return collection.get(record_id)
 
+    def iter_records(
+            self,
+            collection: str = DB_COMMAND_HISTORY,
+            where: dict = None,
+            where_document: dict = None,
+            limit: int = None,
+            offset: int = 0,
+            page_size: int = MEMORY_PAGE_SIZE,
+            include: List[str] = None
+    ):
+        """
+        iter_records: iterate the records page by page, the filters are applied by the database,
+        so that only one page is loaded at a time.
+        Args:
+            collection: the name of the collection.
+            where: the filter on the metadata, e.g. {"created_ts": {"$gte": 1700000000}}.
+            where_document: the filter on the document, e.g. {"$contains": "git"}.
+            limit: the maximum number of records, all the records if not set.
+            offset: the number of records to skip.
+            page_size: the number of records in each page.
+            include: the fields of the records, default is the documents and the metadatas.
+
+        Returns: a generator of the pages, in the same format as `get`.
+        """
+        handle = self.collection(collection)
+        while limit is None or limit > 0:
+            size = page_size if limit is None else min(page_size, limit)
+            page = handle.get(
+                where=where or None, where_document=where_document or None, limit=size, offset=offset,
+                include=include or ['documents', 'metadatas']
+            )
+            if not page['ids']:
+                return
+
+            yield page
+            offset += len(page['ids'])
+            if limit is not None:
+                limit -= len(page['ids'])
+            if len(page['ids']) < size:
+                return
+
     def delete(self, collection_name: str = DB_COMMAND_HISTORY):
         """
         delete: delete the memery collections.
         Args:
             collection_name: the name of the collection to delete.
         """
+        self.collections.pop(collection_name, None)
+        self.lexical.delete(collection=collection_name)
         return self.client.delete_collection(name=collection_name)
 
     def count(self, collection_name: str = DB_COMMAND_HISTORY):
@@ -130,12 +707,42 @@ class Memory:
         Args:
             collection_name: the name of the collection to count.
         """
-
-        return self.client.get_collection(name=collection_name).count()
+        return self.collection(collection_name).count()
 
     def reset(self):
         """
         reset: reset the memory.
         Notice: You may need to set the environment variable `ALLOW_RESET` to `TRUE` to enable this function.
         """
+        self.collections.clear()
+        self.lexical.delete(collection=None)
         self.client.reset()
+
+
+def make_record_id(query: str, response: str):
+    """
+    make_record_id: the content-addressed id of a record, the same query and response always share the same id.
+    Args:
+        query: the query of the record.
+        response: the response of the record.
+    """
+    return hashlib.sha1(f"{normalize_text(query)}\x00{response.strip()}".encode('utf-8')).hexdigest()
+
+
+def get_record_score(metadata: dict):
+    """
+    get_record_score: the retention score of a record, the last use in seconds plus a bonus for each hit.
+    The commands imported from the shell history, tagged by their `source`, are evicted before the saved ones.
+    Args:
+        metadata: the metadata of the record.
+    """
+    last_used_at = metadata.get('last_used_at', metadata.get('created_ts'))
+    if last_used_at is None:
+        # the records saved before the hit counters only carry the ISO creation time.
+        try:
+            last_used_at = datetime.fromisoformat(metadata['created_at']).timestamp()
+        except (KeyError, ValueError):
+            last_used_at = 0
+
+    penalty = EVICTION_IMPORT_PENALTY if metadata.get('source') else 0
+    return last_used_at + metadata.get('hit_count', 0) * EVICTION_HIT_BONUS - penalty
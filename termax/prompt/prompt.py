@@ -1,10 +1,128 @@
 from .memory import Memory
+from .budget import TokenBudget
 from termax.utils.metadata import *
-from termax.utils import CONFIG_SEC_OPENAI
+from termax.utils.path_index import validate_command
+from termax.utils import Config, CONFIG_SEC_OPENAI, CONFIG_SEC_GENERAL
 
 import textwrap
 from datetime import datetime
 
+# The templates are split into a static prefix (the rules and the system information) and a dynamic suffix
+# (the workspace, the history and the samples). The prefix stays byte-identical across the requests.
+# NOTE: the prefix is ~200 tokens, below the ~1024 tokens the providers require before caching a prefix,
+# so no prefix is marked as cacheable, padding the prompt to the minimum would cost more than it saves.
+SUGGESTIONS_STATIC = textwrap.dedent(
+    """\
+    You are an shell expert, you need to assist user to infer the next command based on
+     user's given intent description.
+
+    Here are some rules you need to follow:
+    1. Please provide only shell commands as the format below for os without any description.
+    2. Ensure the output is a valid shell command.
+
+    The output shell commands is (please replace the `{{commands}}` with the actual commands):
+
+    Commands: ${{commands}}
+
+    [INFORMATION] The user's current system information:
+
+    1. OS: {platform}
+    2. OS Version: {platform_version}
+    3. Architecture: {architecture}
+
+    """
+)
+
+SUGGESTIONS_DYNAMIC = textwrap.dedent(
+    """\
+    [INFORMATION] The user's current PATH information:
+
+    1. User: {user}
+    2. Current PATH: {current_directory}
+    3. Files under the current directory: {files}
+    4. Directories under the current directory: {directory}
+    5. Invisible files under the current directory: {invisible_files}
+    6. Invisible directories under the current directory: {invisible_directory}
+    7. Summary of the current directory: {summary}
+
+    [INFORMATION] The current time: {time}
+
+    [INFORMATION] The primary command information:
+    {primary_data}
+    """
+)
+
+COMMANDS_STATIC = textwrap.dedent(
+    """\
+    You are an shell expert, you can convert natural language text from user to shell commands.
+
+    1. Please provide only shell commands for os without any description.
+    2. Ensure the output is a valid shell command.
+    3. If multiple steps required try to combine them together.
+
+    Here are some rules you need to follow:
+
+    1. The commands should be able to run on the current system according to the system information.
+    2. The files in the commands should be available in the path, according to the path information.
+    3. The CLI application should be installed in the system (check the path information).
+
+    The output shell commands is (please replace the `{{commands}}` with the actual commands):
+
+    Commands: ${{commands}}
+
+    Here are some information you may need to know:
+
+    [INFORMATION] The user's current system information:
+    1. OS: {platform}
+    2. OS Version: {platform_version}
+    3. Architecture: {architecture}
+
+    """
+)
+
+COMMANDS_DYNAMIC = textwrap.dedent(
+    """\
+    [INFORMATION] The user's current PATH information:
+    1. User: {user}
+    2. Current PATH: {current_directory}
+    3. Files under the current directory: {files}
+    4. Directories under the current directory: {directory}
+    5. Invisible files under the current directory: {invisible_files}
+    6. Invisible directories under the current directory: {invisible_directory}
+    7. Summary of the current directory: {summary}
+
+    Here are the user's most recent shell commands, the latest first:
+    {history}
+
+    Here are some similar commands generated before:
+    {samples}
+    """
+)
+
+SAMPLE_TEMPLATE = textwrap.dedent(
+    """\
+    User Input: {document}
+    Generated Commands: {response}
+    Distance Score: {distance}
+    Date: {created_at}
+    """
+)
+
+
+class SystemPrompt(str):
+    """
+    SystemPrompt: the system prompt, a static prefix followed by a dynamic suffix.
+    It can be used as a plain string.
+    The `sections` carries the token breakdown of each section.
+    """
+
+    def __new__(cls, static: str, dynamic: str, sections: dict = None):
+        prompt = super().__new__(cls, static + dynamic)
+        prompt.static = static
+        prompt.dynamic = dynamic
+        prompt.sections = sections or {}
+        return prompt
+
 
 class Prompt:
     def __init__(self, memory):
@@ -13,10 +131,21 @@ class Prompt:
         Args:
             memory: the memory instance.
         """
-        # TODO: make the sync of system related metadata once happened at the initialization
-        self.system_metadata = get_system_metadata()
-        self.path_metadata = get_path_metadata()
-        # self.command_history = get_command_history()
+        config_dict = Config().read()
+        self.config = config_dict.get(CONFIG_SEC_GENERAL, {})
+        self.file_token_budget = int(self.config.get('file_token_budget', FILE_TOKEN_BUDGET))
+        self.budget = TokenBudget(
+            config_dict.get(self.config.get('platform'), {}).get('model'),
+            int(self.config.get('prompt_token_budget', PROMPT_TOKEN_TARGET))
+        )
+        # answer from the memory directly if the nearest sample is close enough, disabled by default.
+        threshold = self.config.get('semantic_threshold')
+        self.semantic_threshold = float(threshold) if threshold not in (None, '', 'None') else None
+
+        # the system metadata is a cached snapshot, refreshed in the background once expired.
+        metadata = collect_metadata({'system': get_system_metadata, 'path': get_path_metadata})
+        self.system_metadata = metadata['system']
+        self.path_metadata = metadata['path']
 
         # share the same memory instance.
         if memory is None:
@@ -24,94 +153,70 @@ class Prompt:
         else:
             self.memory = memory
 
-    def gen_suggestions(self, primary: str, model: str = CONFIG_SEC_OPENAI):
+    def recall_command(self, text: str):
+        """
+        [Prompt] Recall the command of the nearest sample in the memory, skipping the LLM.
+        Args:
+            text: the natural language text.
+
+        Returns: the command if the nearest sample is within the semantic threshold and still runnable, else None.
+        """
+        if self.semantic_threshold is None:
+            return None
+
+        try:
+            samples = self.memory.search(
+                [text], n_results=1, mode=RETRIEVAL_VECTOR, project_id=get_project_metadata()['project_id']
+            )
+        except Exception:
+            return None
+        if not samples['distances'][0] or samples['distances'][0][0] > self.semantic_threshold:
+            return None
+
+        command = samples['metadatas'][0][0]['response']
+        if not validate_command(command):
+            return None
+
+        self.memory.record_hits(samples['ids'][0][:1])
+        return command
+
+    def gen_suggestions(self, primary: str):
         """
         [Prompt] Generate the suggestions based on the environment and the history.
         Args:
             primary: the primary data source, could be git or docker.
-            model: the model to use, default is OpenAI.
         """
+        collectors = {'files': lambda: get_file_metadata(token_budget=self.file_token_budget)}
         if primary == 'git':
-            primary_data = "\n".join(
-                f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(get_git_metadata().items()))
+            collectors['git'] = get_git_metadata
         elif primary == 'docker':
-            primary_data = "\n".join(
-                f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(get_docker_metadata().items()))
-        else:
-            primary_data = 'No primary data source available'
+            collectors['docker'] = get_docker_metadata
+        metadata = collect_metadata(collectors)
 
-        files = get_file_metadata()
-        if model == CONFIG_SEC_OPENAI:
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you need to assist user to infer the next command based on
-                 user's given intent description.
-                
-                [INFORMATION] The user's current system information:
-                
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                [INFORMATION] The current time: {datetime.now().isoformat()}
-
-                [INFORMATION] The primary command information:
-                {primary_data}
-                
-                Here are some rules you need to follow:
-                1. Please provide only shell commands as the format below for os without any description.
-                2. Ensure the output is a valid shell command.
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
+        if primary in ('git', 'docker'):
+            primary_data = [f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(metadata[primary].items())]
         else:
-            # TODO: add more models specific prompt
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you need to assist user to infer the next command based on
-                 user's given intent description.
-                
-                [INFORMATION] The user's current system information:
-                
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                [INFORMATION] The current time: {datetime.now().isoformat()}
-
-                [INFORMATION] The primary command information:
-                {primary_data}
-                
-                Here are some rules you need to follow:
-                1. Please provide only shell commands as the format below for os without any description.
-                2. Ensure the output is a valid shell command.
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
+            primary_data = ['No primary data source available']
+
+        files = metadata['files']
+        static = SUGGESTIONS_STATIC.format_map(self.system_metadata)
+        values = {**self.path_metadata, 'summary': files['summary'], 'time': datetime.now().isoformat()}
+        kept, breakdown = self.budget.fit(
+            {'system': static, 'path': SUGGESTIONS_DYNAMIC.format_map(MetadataUnavailable(values))},
+            {
+                'primary': primary_data,
+                **{key: files.get(key, []) for key in ('files', 'directory', 'invisible_files', 'invisible_directory')}
+            }
+        )
+
+        # TODO: add more models specific prompt
+        return SystemPrompt(
+            static,
+            SUGGESTIONS_DYNAMIC.format_map(
+                MetadataUnavailable({**values, **kept, 'primary_data': "\n".join(kept['primary']) or METADATA_UNAVAILABLE})
+            ),
+            sections=breakdown
+        )
 
     def explain_commands(self, model: str = CONFIG_SEC_OPENAI):
         """
@@ -125,105 +230,60 @@ class Prompt:
             # TODO: add more models specific prompt
             return f"Help me describe this command:"
 
-    def gen_commands(self, text: str, model: str = CONFIG_SEC_OPENAI):
+    def gen_commands(self, text: str):
         """
         [Prompt] Convert the natural language text to the commands.
         Args:
             text: the natural language text.
-            model: the model to use, default is OpenAI.
         """
-        # query the history database to get similar samples
-        samples = self.memory.query([text])
+        # query the history database for similar samples while refreshing the metadata
+        metadata = collect_metadata(
+            {
+                'samples': lambda: self.memory.search([text], project_id=get_project_metadata()['project_id']),
+                'files': lambda: get_file_metadata(text, token_budget=self.file_token_budget),
+                'history': get_command_history
+            },
+            fallbacks={'samples': {'metadatas': [[]], 'documents': [[]], 'distances': [[]]}}
+        )
+        samples = metadata['samples']
         metadatas = samples['metadatas'][0]
         documents = samples['documents'][0]
         distances = samples['distances'][0]
 
-        # construct a string that contains the samples in a human-readable format
-        sample_string = ""
-        for i in range(len(documents)):
-            sample_string += f"""
-            User Input: {documents[i]}
-            Generated Commands: {metadatas[i]['response']}
-            Distance Score: {distances[i]}
-            Date: {metadatas[i]['created_at']}\n
-            """
-
-        # refresh the metadata
-        files = get_file_metadata()
-        if model == CONFIG_SEC_OPENAI:
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you can convert natural language text from user to shell commands.
-                
-                1. Please provide only shell commands for os without any description.
-                2. Ensure the output is a valid shell command.
-                3. If multiple steps required try to combine them together.
-                
-                Here are some rules you need to follow:
-
-                1. The commands should be able to run on the current system according to the system information.
-                2. The files in the commands should be available in the path, according to the path information.
-                3. The CLI application should be installed in the system (check the path information).
-
-                Here are some information you may need to know:
-                
-                [INFORMATION] The user's current system information:
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-    
-                Here are some similar commands generated before:
-                {sample_string}
-
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
-        else:
-            # TODO: add more models specific prompt
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you can convert natural language text from user to shell commands.
-                
-                1. Please provide only shell commands for os without any extra description.
-                2. Ensure the output is a valid shell command.
-                3. If multiple steps required try to combine them together.
-                
-                Here are some rules you need to follow:
-
-                1. The commands should be able to run on the current system according to the system information.
-                2. The files in the commands should be available in the path, according to the path information.
-                3. The CLI application should be installed in the system (check the path information).
-
-                Here are some information you may need to know:
-                
-                [INFORMATION] The user's current system information:
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                Here are some similar commands generated before:
-                {sample_string}
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
+        # construct the samples in a human-readable format
+        samples = [
+            SAMPLE_TEMPLATE.format(
+                document=documents[i], response=metadatas[i]['response'],
+                distance=distances[i] if distances[i] is not None else 'N/A', created_at=metadatas[i]['created_at']
+            ) for i in range(len(documents))
+        ]
+
+        history = metadata['history']
+        history = [entry['command'] for entry in history.get('shell_command_history', [])] \
+            if isinstance(history, dict) else []
+
+        files = metadata['files']
+        static = COMMANDS_STATIC.format_map(self.system_metadata)
+        values = {**self.path_metadata, 'summary': files['summary']}
+        kept, breakdown = self.budget.fit(
+            {'system': static, 'path': COMMANDS_DYNAMIC.format_map(MetadataUnavailable(values))},
+            {
+                'history': history,
+                'samples': samples,
+                **{key: files.get(key, []) for key in ('files', 'directory', 'invisible_files', 'invisible_directory')}
+            }
+        )
+
+        # TODO: add more models specific prompt
+        return SystemPrompt(
+            static,
+            COMMANDS_DYNAMIC.format_map(
+                MetadataUnavailable({
+                    **values,
+                    **kept,
+                    'history': kept['history'] or METADATA_UNAVAILABLE,
+                    'samples': "\n".join(kept['samples']) or METADATA_UNAVAILABLE
+                })
+            ),
+            sections=breakdown
+        )
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import struct
+import tempfile
+from array import array
+
+from termax.utils.const import *
+
+# the length prefix of the JSON header of the snapshot and of each chunk.
+BLOCK_LENGTH = struct.Struct('<I')
+
+
+def write_block(file, data: dict):
+    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    file.write(BLOCK_LENGTH.pack(len(payload)))
+    file.write(payload)
+
+
+def read_block(file):
+    prefix = file.read(BLOCK_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < BLOCK_LENGTH.size:
+        raise ValueError("The snapshot is truncated.")
+
+    size, = BLOCK_LENGTH.unpack(prefix)
+    payload = file.read(size)
+    if len(payload) < size:
+        raise ValueError("The snapshot is truncated.")
+    return json.loads(payload)
+
+
+def export_snapshot(memory, path: str, collection: str = DB_COMMAND_HISTORY, chunk_size: int = SNAPSHOT_CHUNK_SIZE):
+    """
+    export_snapshot: export the records of a collection with their embeddings, so that the memory is moved to
+    another machine without embedding the records again.
+    The snapshot is the magic bytes, a JSON header with the embedding model, then the chunks of the records, each
+    chunk is a JSON block of the ids, the documents and the metadata, followed by the embeddings as raw
+    little-endian float32.
+    Args:
+        memory: the memory instance.
+        path: the path of the snapshot.
+        collection: the name of the collection.
+        chunk_size: the number of records in each chunk, only one chunk is loaded at a time.
+
+    Returns: the number of exported records.
+    """
+    exported = 0
+    directory = os.path.dirname(os.path.abspath(path))
+    # the snapshot is written aside then renamed, an interrupted export never leaves a truncated snapshot.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            write_block(file, {
+                'version': SNAPSHOT_VERSION,
+                'model': memory.get_collection_model(memory.collection(collection)),
+                'collection': collection
+            })
+            for page in memory.iter_records(
+                    collection, page_size=chunk_size, include=['documents', 'metadatas', 'embeddings']
+            ):
+                vectors = array('f', [value for embedding in page['embeddings'] for value in embedding])
+                if sys.byteorder == 'big':
+                    vectors.byteswap()
+                write_block(file, {
+                    'ids': page['ids'],
+                    'documents': page['documents'],
+                    'metadatas': page['metadatas'],
+                    'dim': len(vectors) // len(page['ids'])
+                })
+                file.write(vectors.tobytes())
+                exported += len(page['ids'])
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return exported
+
+
+def read_snapshot(path: str):
+    """
+    read_snapshot: stream a snapshot chunk by chunk.
+    Args:
+        path: the path of the snapshot.
+
+    Returns: a generator, the header first, then the chunks with the embeddings decoded.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a Termax snapshot.")
+        header = read_block(file)
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {header.get('version')} not supported.")
+        yield header
+
+        while True:
+            chunk = read_block(file)
+            if chunk is None:
+                return
+
+            vectors = array('f')
+            size = len(chunk['ids']) * chunk['dim'] * vectors.itemsize
+            data = file.read(size)
+            if len(data) < size:
+                raise ValueError("The snapshot is truncated.")
+            vectors.frombytes(data)
+            if sys.byteorder == 'big':
+                vectors.byteswap()
+            chunk['embeddings'] = [
+                vectors[i * chunk['dim']:(i + 1) * chunk['dim']].tolist() for i in range(len(chunk['ids']))
+            ]
+            yield chunk
+
+
+def import_snapshot(memory, path: str, collection: str = None, callback=None):
+    """
+    import_snapshot: load the records of a snapshot with their embeddings, the records of the same ids are replaced.
+    An empty collection takes the embedding model of the snapshot, a collection of another model is rejected.
+    Args:
+        memory: the memory instance.
+        path: the path of the snapshot.
+        collection: the name of the collection, default is the collection of the snapshot.
+        callback: called with the number of imported records after each chunk.
+
+    Returns: the number of imported records.
+    """
+    chunks = read_snapshot(path)
+    header = next(chunks)
+    collection = collection or header['collection']
+    handle = memory.collection(collection, validate=True)
+    model_name = memory.get_collection_model(handle)
+    if header['model'] != model_name:
+        if handle.count():
+            # the embeddings of different models are not comparable.
+            raise ValueError(
+                f"The snapshot is embedded by {header['model']}, but the memory uses {model_name}."
+            )
+        memory.set_collection_model(header['model'], collection)
+
+    imported = 0
+    for chunk in chunks:
+        memory.upsert_records(
+            chunk['ids'], chunk['documents'], chunk['metadatas'], chunk['embeddings'], collection
+        )
+        imported += len(chunk['ids'])
+        if callback:
+            callback(imported)
+
+    return imported
@@ -0,0 +1,516 @@
+import os
+import json
+import time
+import shutil
+import warnings
+import tempfile
+import functools
+import contextlib
+from typing import List, Dict
+
+from termax.utils.const import *
+
+INCLUDE_GET = ['documents', 'metadatas']
+INCLUDE_QUERY = ['documents', 'metadatas', 'distances']
+
+
+def locked(method):
+    """
+    locked: run a write of a collection under its lock, from reading the current records to replacing them.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class FlatCollection:
+    """
+    FlatCollection: a collection which keeps the vectors in a memory-mapped float32 array and the records in a
+    sidecar JSON lines file, queried by the exact cosine distance. It follows the interface of the ChromaDB collection.
+    """
+
+    def __init__(self, path: str, name: str, embedding_function=None, metadata: Dict = None):
+        """
+        Args:
+            path: the directory of the collection.
+            name: the name of the collection.
+            embedding_function: the function to embed the documents and the query texts.
+            metadata: the metadata of the collection, replacing the current one if set.
+        """
+        import numpy
+
+        self.np = numpy
+        self.path = path
+        self.name = name
+        self.embedding_function = embedding_function
+        self.records_path = os.path.join(path, 'records.jsonl')
+        self.lock_depth = 0
+        os.makedirs(path, exist_ok=True)
+        self.load()
+        if metadata is not None and metadata != self.metadata:
+            self.modify(metadata=metadata)
+
+    def load(self):
+        """
+        load: load the records and map the vectors, the rows beyond the records are left by an interrupted write.
+        A corrupt records file is moved aside, so that the next write never overwrites it.
+        """
+        self.header = {'vectors': None, 'dim': None}
+        self.ids, self.documents, self.metadatas = [], [], []
+        # the size of the complete lines, a partial line is left by an interrupted write.
+        self.records_size = 0
+        self.stamp = None
+        try:
+            with open(self.records_path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                data = file.read()
+            self.stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            data = None
+
+        if data:
+            records_size = data.rfind(b'\n') + 1
+            header, _, lines = data[:records_size].partition(b'\n')
+            try:
+                header = json.loads(header)
+                # decode the records in one pass, much faster than decoding line by line.
+                records = json.loads(b'[' + lines.rstrip(b'\n').replace(b'\n', b',') + b']')
+                ids = [record['id'] for record in records]
+                documents = [record['document'] for record in records]
+                metadatas = [record['metadata'] for record in records]
+            except (ValueError, KeyError, TypeError):
+                self.quarantine(self.stamp)
+                return self.load()
+
+            self.header, self.ids, self.documents, self.metadatas = header, ids, documents, metadatas
+            self.records_size = records_size
+
+        self.index = {record_id: row for row, record_id in enumerate(self.ids)}
+        self.vectors = self.np.zeros((0, self.header['dim'] or 0), dtype=self.np.float32)
+        if self.ids:
+            self.vectors = self.np.memmap(
+                self.vectors_path, dtype=self.np.float32, mode='r', shape=(len(self.ids), self.header['dim'])
+            )
+        self.norms = None
+
+    def quarantine(self, stamp: tuple):
+        """
+        quarantine: move a corrupt records file aside, unless another process has replaced it meanwhile.
+        Args:
+            stamp: the stamp of the corrupt file.
+        """
+        with self.lock():
+            try:
+                stat = os.stat(self.records_path)
+            except OSError:
+                return
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) != stamp:
+                return
+
+            corrupt_path = f"{self.records_path}.corrupt-{int(time.time())}"
+            os.replace(self.records_path, corrupt_path)
+        warnings.warn(f"The records of the collection {self.name} are corrupt, moved to {corrupt_path}.")
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        lock: hold an exclusive lock on the collection, the writes of the other processes wait until it is released.
+        The lock is reentrant, e.g. `upsert` calls `update` and `add`.
+        """
+        if self.lock_depth:
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+            return
+
+        try:
+            import fcntl
+        except ImportError:
+            # no advisory locks on Windows, the concurrent writers may lose the updates of each other.
+            fcntl = None
+
+        # the directory is removed if the collection was deleted by another process.
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.records_path + '.lock', 'w') as file:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            self.lock_depth = 1
+            try:
+                yield
+            finally:
+                self.lock_depth = 0
+                if fcntl:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self):
+        """
+        refresh: reload the collection once it has been changed by another process.
+        """
+        try:
+            stat = os.stat(self.records_path)
+            stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stamp = None
+        if stamp != self.stamp:
+            self.load()
+
+    @property
+    def metadata(self):
+        return self.header.get('metadata')
+
+    @locked
+    def modify(self, metadata: Dict = None):
+        """
+        modify: replace the metadata of the collection, it is kept in the header of the records.
+        """
+        self.refresh()
+        self.header['metadata'] = metadata
+        self.write(self.ids, None, self.documents, self.metadatas)
+        self.load()
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.path, self.header['vectors']) if self.header['vectors'] else None
+
+    def embed(self, texts: List[str]):
+        if self.embedding_function is None:
+            raise ValueError("The embeddings are required, no embedding function is set.")
+        return self.embedding_function(texts)
+
+    def count(self):
+        self.refresh()
+        return len(self.ids)
+
+    @locked
+    def add(self, ids: List[str], embeddings: List[List[float]] = None, metadatas: List[Dict] = None,
+            documents: List[str] = None):
+        """
+        add: append the records, the vectors are appended before the records, so that the records are never ahead.
+        The existing ids are ignored as ChromaDB does, e.g. added by another process meanwhile.
+        """
+        self.refresh()
+        if len(set(ids)) != len(ids):
+            raise ValueError("Expected the IDs to be unique.")
+        new = [i for i, record_id in enumerate(ids) if record_id not in self.index]
+        if not new:
+            return
+        documents = [documents[i] for i in new] if documents else [None] * len(new)
+        metadatas = [metadatas[i] for i in new] if metadatas else [None] * len(new)
+        embeddings = [embeddings[i] for i in new] if embeddings is not None else None
+        ids = [ids[i] for i in new]
+
+        vectors = self.np.asarray(embeddings if embeddings is not None else self.embed(documents), dtype=self.np.float32)
+        if self.header['dim'] is not None and self.ids and vectors.shape[1] != self.header['dim']:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality "
+                             f"{self.header['dim']}.")
+
+        if not self.ids:
+            # start a new generation of the files, the records file is the last to be replaced.
+            self.write(ids, vectors, documents, metadatas)
+            self.load()
+            return
+
+        # drop the leftovers of an interrupted write before appending.
+        with open(self.vectors_path, 'r+b') as file:
+            file.truncate(len(self.ids) * self.header['dim'] * vectors.itemsize)
+            file.seek(0, os.SEEK_END)
+            file.write(vectors.tobytes())
+        lines = [
+            json.dumps({'id': record_id, 'document': document, 'metadata': metadata}).encode('utf-8') + b'\n'
+            for record_id, document, metadata in zip(ids, documents, metadatas)
+        ]
+        with open(self.records_path, 'r+b') as file:
+            file.truncate(self.records_size)
+            file.seek(0, os.SEEK_END)
+            file.writelines(lines)
+            file.flush()
+            stat = os.fstat(file.fileno())
+
+        # extend the loaded records instead of loading them again.
+        for record_id, document, metadata in zip(ids, documents, metadatas):
+            self.index[record_id] = len(self.ids)
+            self.ids.append(record_id)
+            self.documents.append(document)
+            self.metadatas.append(metadata)
+        self.records_size += sum(len(line) for line in lines)
+        self.stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self.vectors = self.np.memmap(
+            self.vectors_path, dtype=self.np.float32, mode='r', shape=(len(self.ids), self.header['dim'])
+        )
+        self.norms = None
+
+    @locked
+    def upsert(self, ids: List[str], embeddings: List[List[float]] = None, metadatas: List[Dict] = None,
+               documents: List[str] = None):
+        """
+        upsert: update the existing records and add the others.
+        """
+        self.refresh()
+        existing = [i for i, record_id in enumerate(ids) if record_id in self.index]
+        if existing:
+            self.update(
+                ids=[ids[i] for i in existing],
+                embeddings=[embeddings[i] for i in existing] if embeddings is not None else None,
+                metadatas=[metadatas[i] for i in existing] if metadatas is not None else None,
+                documents=[documents[i] for i in existing] if documents is not None else None
+            )
+
+        new = [i for i, record_id in enumerate(ids) if record_id not in self.index]
+        if new:
+            self.add(
+                ids=[ids[i] for i in new],
+                embeddings=[embeddings[i] for i in new] if embeddings is not None else None,
+                metadatas=[metadatas[i] for i in new] if metadatas is not None else None,
+                documents=[documents[i] for i in new] if documents is not None else None
+            )
+
+    @locked
+    def update(self, ids: List[str], embeddings: List[List[float]] = None, metadatas: List[Dict] = None,
+               documents: List[str] = None):
+        """
+        update: update the records in place, the missing ids are ignored.
+        """
+        self.refresh()
+        rows = [self.index.get(record_id) for record_id in ids]
+        if documents is not None and embeddings is None:
+            embeddings = self.embed(documents)
+        # the vectors file is only rewritten if the vectors are changed.
+        vectors = self.np.array(self.vectors) if embeddings is not None else None
+
+        for i, row in enumerate(rows):
+            if row is None:
+                continue
+            if metadatas is not None:
+                self.metadatas[row] = {**(self.metadatas[row] or {}), **metadatas[i]}
+            if documents is not None:
+                self.documents[row] = documents[i]
+            if embeddings is not None:
+                vectors[row] = embeddings[i]
+
+        self.write(self.ids, vectors, self.documents, self.metadatas)
+        self.load()
+
+    @locked
+    def delete(self, ids: List[str] = None, where: Dict = None):
+        """
+        delete: delete the records, the remaining records are written as a new generation.
+        """
+        self.refresh()
+        if ids is None and where is None:
+            deleted = set(self.ids)
+        else:
+            deleted = set(self.get(ids=ids, where=where, include=[])['ids'])
+        rows = [row for row, record_id in enumerate(self.ids) if record_id not in deleted]
+        self.write(
+            [self.ids[row] for row in rows], self.np.array(self.vectors)[rows],
+            [self.documents[row] for row in rows], [self.metadatas[row] for row in rows]
+        )
+        self.load()
+
+    def write(self, ids: List[str], vectors, documents: List[str], metadatas: List[Dict]):
+        """
+        write: write a new generation of the vectors and the records, then remove the old vectors.
+        The current vectors are kept if the vectors is None. It is called under the lock.
+        """
+        # the directory is removed if the collection was deleted by another process.
+        os.makedirs(self.path, exist_ok=True)
+        old_vectors_path = self.vectors_path
+        if vectors is None:
+            vectors_path, dim = old_vectors_path, self.header['dim']
+        else:
+            fd, vectors_path = tempfile.mkstemp(dir=self.path, prefix='vectors.', suffix='.f32')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(self.np.ascontiguousarray(vectors, dtype=self.np.float32).tobytes())
+            dim = int(vectors.shape[1]) if len(ids) else None
+
+        fd, records_path = tempfile.mkstemp(dir=self.path, prefix='.records.')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'vectors': os.path.basename(vectors_path) if vectors_path else None,
+                                   'dim': dim, 'metadata': self.metadata}) + '\n')
+            file.writelines(
+                json.dumps({'id': record_id, 'document': document, 'metadata': metadata}) + '\n'
+                for record_id, document, metadata in zip(ids, documents, metadatas)
+            )
+        os.replace(records_path, self.records_path)
+
+        # release the mapping before removing the file, it is required on Windows.
+        self.vectors = None
+        if old_vectors_path and old_vectors_path != vectors_path and os.path.exists(old_vectors_path):
+            os.remove(old_vectors_path)
+
+    def select(self, ids: List[str] = None, where: Dict = None, where_document: Dict = None):
+        """
+        select: the rows matching the ids and the filters, in the order of insertion.
+        """
+        if ids is not None:
+            rows = [self.index[record_id] for record_id in ids if record_id in self.index]
+        else:
+            rows = range(len(self.ids))
+
+        return [
+            row for row in rows
+            if (not where or match_where(self.metadatas[row] or {}, where))
+            and (not where_document or match_where_document(self.documents[row] or '', where_document))
+        ]
+
+    def results(self, rows: List[int], include: List[str]):
+        return {
+            'ids': [self.ids[row] for row in rows],
+            'documents': [self.documents[row] for row in rows] if 'documents' in include else None,
+            'metadatas': [self.metadatas[row] for row in rows] if 'metadatas' in include else None,
+            'embeddings': [self.vectors[row].tolist() for row in rows] if 'embeddings' in include else None
+        }
+
+    def get(self, ids: List[str] = None, where: Dict = None, limit: int = None, offset: int = None,
+            where_document: Dict = None, include: List[str] = INCLUDE_GET):
+        self.refresh()
+        if isinstance(ids, str):
+            ids = [ids]
+        rows = self.select(ids, where, where_document)
+        offset = offset or 0
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+        return self.results(rows, include)
+
+    def peek(self, limit: int = 10):
+        return self.get(limit=limit, include=INCLUDE_GET + ['embeddings'])
+
+    def query(self, query_embeddings: List[List[float]] = None, query_texts: List[str] = None,
+              n_results: int = 10, where: Dict = None, where_document: Dict = None,
+              include: List[str] = INCLUDE_QUERY):
+        """
+        query: find the nearest records of each query by the exact cosine distance.
+        """
+        self.refresh()
+        if query_embeddings is None:
+            query_embeddings = self.embed(query_texts)
+        queries = self.np.asarray(query_embeddings, dtype=self.np.float32)
+
+        if self.norms is None:
+            # the norms are computed once, the vectors stay in the mapped file.
+            self.norms = self.np.maximum(self.np.linalg.norm(self.np.asarray(self.vectors), axis=1), 1e-12)
+
+        if where or where_document:
+            rows = self.np.asarray(self.select(where=where, where_document=where_document), dtype=self.np.int64)
+            vectors, norms = self.np.asarray(self.vectors)[rows], self.norms[rows]
+        else:
+            rows = self.np.arange(len(self.ids))
+            vectors, norms = self.np.asarray(self.vectors), self.norms
+
+        queries = queries / self.np.maximum(self.np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        results = {key: [] for key in ('ids', 'documents', 'metadatas', 'embeddings', 'distances')}
+        for query in queries:
+            if len(rows):
+                similarities = vectors @ query / norms
+                k = min(n_results, len(rows))
+                top = self.np.argpartition(-similarities, k - 1)[:k]
+                top = top[self.np.argsort(-similarities[top])]
+                selected, distances = rows[top].tolist(), (1 - similarities[top]).tolist()
+            else:
+                selected, distances = [], []
+
+            result = self.results(selected, include)
+            for key in ('ids', 'documents', 'metadatas', 'embeddings'):
+                results[key].append(result[key])
+            results['distances'].append(distances)
+
+        return {
+            key: value if key == 'ids' or key in include else None for key, value in results.items()
+        }
+
+
+class FlatClient:
+    """
+    FlatClient: the client of the flat collections, it follows the interface of the ChromaDB client.
+    """
+
+    # the flat collections have no batch limit, it is only kept for the compatibility.
+    max_batch_size = 5461
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: the directory of the collections.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get_or_create_collection(self, name: str, metadata: Dict = None, embedding_function=None):
+        return FlatCollection(os.path.join(self.path, name), name, embedding_function, metadata)
+
+    def get_collection(self, name: str, embedding_function=None):
+        if not os.path.isdir(os.path.join(self.path, name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name, embedding_function=embedding_function)
+
+    def delete_collection(self, name: str):
+        if not os.path.isdir(os.path.join(self.path, name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(os.path.join(self.path, name))
+
+    def reset(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        return True
+
+
+def match_where(metadata: dict, where: dict):
+    """
+    match_where: check a metadata against a ChromaDB `where` filter, e.g. {"created_ts": {"$gte": 0}}.
+    Args:
+        metadata: the metadata of a record.
+        where: the filter.
+    """
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not WHERE_OPERATORS[operator](value, operand):
+                    return False
+
+    return True
+
+
+def match_where_document(document: str, where_document: dict):
+    """
+    match_where_document: check a document against a ChromaDB `where_document` filter, e.g. {"$contains": "git"}.
+    Args:
+        document: the document of a record.
+        where_document: the filter.
+    """
+    for operator, operand in where_document.items():
+        if operator == '$contains' and operand not in document:
+            return False
+        elif operator == '$not_contains' and operand in document:
+            return False
+        elif operator == '$and' and not all(match_where_document(document, clause) for clause in operand):
+            return False
+        elif operator == '$or' and not any(match_where_document(document, clause) for clause in operand):
+            return False
+
+    return True
+
+
+WHERE_OPERATORS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand
+}
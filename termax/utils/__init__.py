@@ -1,4 +1,10 @@
 from .const import *
 from .config import *
+from .cache import *
+from .result_cache import *
+from .tokens import *
+from .git import *
+from .docker import *
+from .path_index import *
 from .metadata import *
 from .qa import *
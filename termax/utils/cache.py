@@ -0,0 +1,58 @@
+import os
+import json
+import tempfile
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+
+
+def get_cache_path(name: str, extension: str = 'json'):
+    """
+    get_cache_path: get the path of a cache file under the Termax home.
+    Args:
+        name: the name of the cache, e.g. `path_index`.
+        extension: the extension of the cache file.
+
+    Returns: the path of the cache file.
+    """
+    return os.path.join(CONFIG_HOME, CACHE_PATH, f"{name}.{extension}")
+
+
+def read_cache(name: str, default=None):
+    """
+    read_cache: read a JSON cache from the Termax home.
+    Args:
+        name: the name of the cache.
+        default: the value to return if the cache is missing or broken.
+
+    Returns: the cached data.
+    """
+    try:
+        with open(get_cache_path(name), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+
+def write_cache(name: str, data, mode: int = 0o600):
+    """
+    write_cache: write a JSON cache to the Termax home atomically, readers never see a partial file.
+    Args:
+        name: the name of the cache.
+        data: the JSON serializable data.
+        mode: the permissions of the cache file, only readable by the user by default, the caches may hold
+         the shell history.
+    """
+    path = get_cache_path(name)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{name}.")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except OSError:
+        # the cache is an optimization only, a failed write should never break the caller.
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
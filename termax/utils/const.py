@@ -14,6 +14,38 @@ COMMAND_HISTORY_COUNT = 15
 DB_PATH = 'database'
 DB_COMMAND_HISTORY = 'history'
 DB_SYS_METRICS = 'system'
+DB_VECTOR_PATH = 'vectors'
+MEMORY_BACKEND_CHROMADB = 'chromadb'
+MEMORY_BACKEND_FLAT = 'flat'
+MEMORY_BACKENDS = [MEMORY_BACKEND_CHROMADB, MEMORY_BACKEND_FLAT]
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'  # the default embedding model of ChromaDB.
+DEFAULT_EMBEDDING_DIM = 384
+COLLECTION_EMBEDDING_MODEL = 'embedding_model'  # the collection metadata of the model which embedded the records.
+EVICTION_LOW_WATERMARK = 0.9  # shrink to 90% of the storage size once it is exceeded.
+EVICTION_BATCH_SIZE = 100
+EVICTION_HIT_BONUS = 24 * 60 * 60  # each hit keeps a record as if it was used a day later.
+EVICTION_IMPORT_PENALTY = 7 * 24 * 60 * 60  # the imported shell commands are evicted as if used a week earlier.
+IMPORT_BATCH_SIZE = 512
+MEMORY_PAGE_SIZE = 100
+JOURNAL_FILE = 'journal.jsonl'
+JOURNAL_BATCH_SIZE = 100
+JOURNAL_FLUSH_INTERVAL = 30  # in seconds, the interval of the daemon to flush the journal.
+RANK_HIT_WEIGHT = 0.05  # the distance bonus of log(1 + hits).
+RANK_CANDIDATES = 3  # fetch 3x the results to rerank.
+PROJECT_METADATA_KEYS = ['cwd', 'git_root', 'project_id']  # moved to the project where a record is used last.
+LEXICAL_INDEX_PATH = 'lexical.sqlite3'
+LEXICAL_INDEX_VERSION = 2  # bumped when the terms are split differently, the older index is rebuilt.
+RETRIEVAL_HYBRID = 'hybrid'
+RETRIEVAL_VECTOR = 'vector'
+RETRIEVAL_LEXICAL = 'lexical'
+RETRIEVAL_MODES = [RETRIEVAL_HYBRID, RETRIEVAL_VECTOR, RETRIEVAL_LEXICAL]
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # the rank constant of the reciprocal rank fusion.
+SNAPSHOT_MAGIC = b'TERMAXS1'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CHUNK_SIZE = 1000
+IMPORT_WORKERS = 4
 
 # LLMs
 CONFIG_SEC_OPENAI = 'openai'
@@ -31,3 +63,94 @@ PLUGIN_SHELL_FISH = 'fish'
 
 
 PLUGIN_LIST = [PLUGIN_SHELL_ZSH, PLUGIN_SHELL_BASH, PLUGIN_SHELL_FISH]
+
+# Daemon
+DAEMON_SOCKET = 'termaxd.sock'
+DAEMON_TIMEOUT = 60
+
+# Cache
+CACHE_PATH = 'cache'
+CACHE_PATH_INDEX = 'path_index'
+CACHE_SYSTEM_METADATA = 'system_metadata'
+CACHE_GIT_METADATA = 'git_metadata'
+CACHE_DOCKER_METADATA = 'docker_metadata'
+CACHE_COMMAND_HISTORY = 'command_history'
+CACHE_PYTHON_METADATA = 'python_metadata'
+CACHE_EMBEDDINGS = 'embeddings'
+EMBEDDING_CACHE_SIZE = 10000  # the maximum number of cached embeddings.
+CACHE_RESULTS = 'results'
+CACHE_RESULT_STATS = 'result_stats'  # the hit and miss counters, apart from the results which are large.
+CACHE_HISTORY_IMPORT = 'history_import'
+RESULT_CACHE_TTL = 24 * 60 * 60
+RESULT_CACHE_SIZE = 500
+
+# Metadata
+SYSTEM_METADATA_TTL = 24 * 60 * 60
+DNS_TIMEOUT = 0.5
+FILE_TOKEN_BUDGET = 500
+FILE_SCAN_LIMIT = 5000
+FILE_SUMMARY_EXTENSIONS = 10
+GIT_CACHE_SIZE = 20
+DOCKER_TIMEOUT = 2
+DOCKER_METADATA_TTL = 10
+DOCKER_MAX_CONTAINERS = 20
+DOCKER_MAX_IMAGES = 20
+METADATA_UNAVAILABLE = 'not available'
+COLLECTOR_DEFAULT_DEADLINE = 2
+COLLECTOR_DEADLINES = {  # in seconds, per collector.
+    'system': 1,
+    'path': 1,
+    'files': 1,
+    'git': 1,
+    'docker': 3,
+    'samples': 5,
+    'history': 1
+}
+HISTORY_CHECKPOINT_SIZE = 200
+HISTORY_RECORD_MARKERS = {'plain': b'', 'with_time': b': ', 'yaml': b'- cmd:'}
+HISTORY_CHUNK_SIZE = 1024 * 1024
+
+# Commands
+SHELL_OPERATOR_CHARS = '();<>|&'
+SHELL_REDIRECTIONS = ['<', '>', '>>', '<<', '<<<', '&>', '>&', '2>', '2>>']
+SHELL_PREFIX_COMMANDS = [  # followed by another command.
+    'sudo', 'env', 'nohup', 'time', 'exec', 'command', 'builtin', 'nice', '!', '{', '}',
+    'if', 'then', 'else', 'elif', 'while', 'until', 'do'
+]
+SHELL_BUILTINS = [
+    'cd', 'echo', 'export', 'source', '.', 'alias', 'unalias', 'set', 'unset', 'pwd', 'type', 'read', 'printf',
+    'test', '[', '[[', 'eval', 'history', 'jobs', 'fg', 'bg', 'kill', 'wait', 'trap', 'ulimit', 'umask', 'true',
+    'false', 'fi', 'for', 'done', 'case', 'esac', 'exit'
+]
+
+# Prompt
+DEFAULT_CONTEXT_SIZE = 4096
+MODEL_CONTEXT_SIZES = {  # in tokens, matched by the longest prefix of the model name.
+    'gpt-3.5-turbo': 16385,
+    'gpt-3.5-turbo-instruct': 4096,
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-4-turbo': 128000,
+    'gpt-4-1106': 128000,
+    'gpt-4-0125': 128000,
+    'gpt-4o': 128000,
+    'llama2': 4096,
+    'llama3': 8192,
+    'mistral': 32000,
+    'mixtral': 32000,
+    'open-mistral': 32000,
+    'open-mixtral': 32000,
+    'gemini-pro': 30720,
+    'gemini-1.5': 1000000,
+    'claude': 200000,
+    'ERNIE-3.5-8K': 8192,
+    'ERNIE-4.0-8K': 8192,
+    'qwen-turbo': 8000,
+    'qwen-plus': 32000,
+    'qwen-max': 8000
+}
+PROMPT_TOKEN_TARGET = 3000
+PROMPT_RESPONSE_RESERVE = 1000
+PROMPT_TRIM_ORDER = [  # the first is trimmed first.
+    'history', 'invisible_files', 'invisible_directory', 'files', 'directory', 'samples', 'primary'
+]
@@ -0,0 +1,116 @@
+import os
+import json
+import socket
+import http.client
+from pathlib import Path
+from urllib.parse import urlencode
+
+from termax.utils.const import *
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    UnixHTTPConnection: an HTTP connection over a Unix domain socket.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = DOCKER_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DockerClient:
+    """
+    DockerClient: a minimal client of the Docker Engine API over the local socket.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = DOCKER_TIMEOUT):
+        """
+        Args:
+            socket_path: the path of the Docker socket, default is detected from `DOCKER_HOST` and the known paths.
+            timeout: the timeout of each request in seconds.
+        """
+        self.socket_path = socket_path or find_docker_socket()
+        self.timeout = timeout
+
+    def get(self, path: str, **params):
+        """
+        get: send a GET request to the Docker Engine API.
+        Args:
+            path: the API path, e.g. `/containers/json`.
+            params: the query parameters, the dictionaries are encoded as JSON.
+
+        Returns: the decoded JSON response.
+        """
+        if self.socket_path is None:
+            raise Exception("Docker command failed: the Docker socket is not found.")
+
+        query = {key: json.dumps(value) if isinstance(value, dict) else value for key, value in params.items()}
+        connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            connection.request('GET', f"{path}?{urlencode(query)}" if query else path)
+            response = connection.getresponse()
+            body = response.read()
+        except OSError as e:
+            raise Exception(f"Docker command failed: {e}")
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise Exception(f"Docker command failed: {body.decode('utf-8', 'replace').strip()}")
+        return json.loads(body)
+
+    def info(self):
+        """
+        info: the system-wide information, including the number of containers and images.
+        """
+        return self.get('/info')
+
+    def containers(self, limit: int = DOCKER_MAX_CONTAINERS):
+        """
+        containers: list the running containers first, then the most recently created ones.
+        Args:
+            limit: the maximum number of containers.
+        """
+        containers = self.get('/containers/json', filters={'status': ['running']})
+        if len(containers) < limit:
+            ids = {container['Id'] for container in containers}
+            recent = self.get('/containers/json', all=1, limit=limit)
+            containers += [container for container in recent if container['Id'] not in ids]
+
+        return containers[:limit]
+
+    def images(self, limit: int = DOCKER_MAX_IMAGES):
+        """
+        images: list the most recently created images.
+        Args:
+            limit: the maximum number of images.
+        """
+        images = self.get('/images/json')
+        return sorted(images, key=lambda image: image.get('Created', 0), reverse=True)[:limit]
+
+
+def find_docker_socket():
+    """
+    find_docker_socket: find the socket of the local Docker daemon.
+
+    Returns: the path of the socket, None if not found.
+    """
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    elif docker_host:
+        return None
+
+    home = str(Path.home())
+    for path in ['/var/run/docker.sock',
+                 os.path.join(home, '.docker', 'run', 'docker.sock'),
+                 os.path.join(home, '.docker', 'desktop', 'docker.sock')]:
+        if os.path.exists(path):
+            return path
+
+    return None
@@ -0,0 +1,228 @@
+import os
+import re
+import zlib
+import subprocess
+from datetime import datetime
+
+SECTION_PATTERN = re.compile(r'^\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+
+
+class GitRepository:
+    """
+    GitRepository: read the git metadata directly from the repository files, without forking git.
+    """
+
+    def __init__(self, git_dir: str, common_dir: str, work_tree: str):
+        """
+        Args:
+            git_dir: the git directory of the work tree, e.g. `.git` or `.git/worktrees/<name>`.
+            common_dir: the directory shared by all the work trees, holding the objects, refs and config.
+            work_tree: the root of the work tree.
+        """
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self.work_tree = work_tree
+
+    def read_head(self):
+        """
+        read_head: read the current branch and commit.
+
+        Returns: a tuple of (branch, sha), the branch is `HEAD` if detached.
+        """
+        head = read_text(os.path.join(self.git_dir, 'HEAD'))
+        if head.startswith('ref:'):
+            ref = head[len('ref:'):].strip()
+            return ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref, self.resolve_ref(ref)
+
+        return 'HEAD', head
+
+    def resolve_ref(self, ref: str):
+        """
+        resolve_ref: resolve a reference to the commit sha, from the loose refs or the packed-refs.
+        Args:
+            ref: the full name of the reference, e.g. `refs/heads/main`.
+
+        Returns: the commit sha, an empty string if the reference does not exist.
+        """
+        for base in dict.fromkeys([self.git_dir, self.common_dir]):
+            value = read_text(os.path.join(base, ref))
+            if value.startswith('ref:'):
+                return self.resolve_ref(value[len('ref:'):].strip())
+            elif value:
+                return value
+
+        for line in read_text(os.path.join(self.common_dir, 'packed-refs')).splitlines():
+            if line and line[0] not in '#^':
+                sha, _, name = line.partition(' ')
+                if name == ref:
+                    return sha
+
+        return ''
+
+    def read_commit(self, sha: str):
+        """
+        read_commit: read a commit from the loose objects.
+        Args:
+            sha: the commit sha.
+
+        Returns: a dictionary of the author, timestamp and message, None if the object is packed.
+        """
+        try:
+            with open(os.path.join(self.common_dir, 'objects', sha[:2], sha[2:]), 'rb') as file:
+                raw = zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            return None
+
+        header, _, body = raw.partition(b'\x00')
+        if not header.startswith(b'commit'):
+            return None
+
+        headers, _, message = body.decode('utf-8', 'replace').partition('\n\n')
+        commit = {'author': '', 'timestamp': 0, 'message': message.strip()}
+        for line in headers.splitlines():
+            # continuation lines of the multi-line headers (e.g. gpgsig) start with a space
+            if line.startswith('author '):
+                commit['author'] = line[len('author '):].rsplit('<', 1)[0].strip()
+            elif line.startswith('committer '):
+                commit['timestamp'] = int(line.rsplit(' ', 2)[-2])
+
+        return commit
+
+    def read_commit_with_git(self):
+        """
+        read_commit_with_git: read the latest commit with a single git invocation, for the packed objects.
+
+        Returns: a dictionary of the author, timestamp and message, None if git failed.
+        """
+        result = subprocess.run(
+            ['git', 'log', '-1', '--format=%an%x00%ct%x00%B'], cwd=self.work_tree,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        if result.returncode != 0:
+            return None
+
+        author, timestamp, message = result.stdout.split('\x00', 2)
+        return {'author': author, 'timestamp': int(timestamp), 'message': message.strip()}
+
+    def read_remotes(self):
+        """
+        read_remotes: read the remotes from the repository config.
+
+        Returns: a list of remotes, in the same format as `git remote -v`.
+        """
+        remotes = {}
+        section, name = None, None
+        for line in read_text(os.path.join(self.common_dir, 'config')).splitlines():
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+
+            match = SECTION_PATTERN.match(line)
+            if match:
+                section, name = match.group(1).lower(), match.group(2)
+                continue
+
+            if section != 'remote' or name is None:
+                continue
+            key, _, value = line.partition('=')
+            key, value = key.strip().lower(), value.strip().strip('"')
+            if key in ('url', 'pushurl'):
+                remotes.setdefault(name, {})[key] = value
+
+        return [
+            {
+                "remote_name": name,
+                "fetch_url": urls.get('url', ''),
+                "push_url": urls.get('pushurl', urls.get('url', ''))
+            } for name, urls in remotes.items()
+        ]
+
+    def fingerprint(self, branch: str = None):
+        """
+        fingerprint: the mtimes of the files the metadata depends on, the metadata is stale once it changes.
+        Args:
+            branch: the current branch, its loose ref file is included.
+
+        Returns: a list of mtimes, None for the missing files.
+        """
+        paths = [
+            os.path.join(self.git_dir, 'HEAD'),
+            os.path.join(self.common_dir, 'packed-refs'),
+            os.path.join(self.common_dir, 'config')
+        ]
+        if branch and branch != 'HEAD':
+            paths.append(os.path.join(self.common_dir, 'refs', 'heads', branch))
+
+        fingerprint = []
+        for path in paths:
+            try:
+                fingerprint.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                fingerprint.append(None)
+
+        return fingerprint
+
+    def metadata(self):
+        """
+        metadata: collect the git metadata of the repository.
+
+        Returns: a dictionary of git metadata.
+        """
+        branch, sha = self.read_head()
+        commit = self.read_commit(sha) if sha else None
+        if sha and commit is None:
+            commit = self.read_commit_with_git()
+        commit = commit or {'author': '', 'timestamp': None, 'message': ''}
+
+        return {
+            "git_sha": sha,
+            "git_current_branch": branch,
+            "git_remotes": self.read_remotes(),
+            "git_latest_commit_author": commit['author'],
+            "git_latest_commit_date": datetime.utcfromtimestamp(commit['timestamp']).strftime(
+                '%Y-%m-%d %H:%M:%S UTC') if commit['timestamp'] is not None else "",
+            "git_latest_commit_message": commit['message']
+        }
+
+
+def find_repository(path: str = None):
+    """
+    find_repository: find the git repository containing the path, including the linked work trees.
+    Args:
+        path: the path to start from, default is the current directory.
+
+    Returns: a GitRepository, None if the path is not in a git repository.
+    """
+    path = os.path.abspath(path or os.getcwd())
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return GitRepository(dot_git, dot_git, path)
+        elif os.path.isfile(dot_git):
+            # a linked work tree or a submodule, the `.git` file points to the git directory
+            content = read_text(dot_git)
+            if content.startswith('gitdir:'):
+                git_dir = os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+                common_dir = read_text(os.path.join(git_dir, 'commondir'))
+                common_dir = os.path.normpath(os.path.join(git_dir, common_dir)) if common_dir else git_dir
+                return GitRepository(git_dir, common_dir, path)
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def read_text(path: str):
+    """
+    read_text: read a small text file from the repository.
+    Args:
+        path: the path of the file.
+
+    Returns: the stripped content, an empty string if the file does not exist.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read().strip()
+    except OSError:
+        return ''
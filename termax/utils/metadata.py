@@ -1,38 +1,86 @@
 import re
 import os
+import mmap
+import hashlib
 import sys
-import psutil
+import time
 import socket
-import shutil
 import getpass
 import platform
+import threading
+import importlib.metadata
 import subprocess
 from datetime import datetime
 
+from termax.utils.const import *
+from termax.utils.cache import read_cache, write_cache
+from termax.utils.git import find_repository
+from termax.utils.docker import DockerClient
+from termax.utils.path_index import get_path_index
+from termax.utils.tokens import count_tokens, split_keywords
 
-def get_git_metadata():
+
+class MetadataUnavailable(dict):
+    """
+    MetadataUnavailable: the placeholder of a collector which failed or missed its deadline.
+    Any field of the placeholder reads as not available.
     """
-    get_git_metadata: Records the git information on the current workspace.
-    Returns: a dictionary of git metadata.
 
+    def __missing__(self, key):
+        return METADATA_UNAVAILABLE
+
+
+def collect_metadata(collectors: dict, deadlines: dict = None, fallbacks: dict = None):
     """
+    collect_metadata: run the metadata collectors concurrently, each collector within its own deadline.
+    The total time is bounded by the slowest allowed collector rather than the sum of them.
+
+    Args:
+        collectors: a dictionary of the collector name and a callable without arguments.
+        deadlines: the deadline of each collector in seconds, default is `COLLECTOR_DEADLINES`.
+        fallbacks: the value of each collector if it fails or misses the deadline, default is `MetadataUnavailable`.
+
+    Returns: a dictionary of the collector name and the collected metadata.
+    """
+    deadlines = {**COLLECTOR_DEADLINES, **(deadlines or {})}
+    fallbacks = fallbacks or {}
+    results = {}
+
+    def run(name, collector):
+        try:
+            results[name] = collector()
+        except Exception:
+            pass
+
+    # daemon threads, a hanging collector should never block the exit of the process.
+    start = time.monotonic()
+    threads = {}
+    for name, collector in collectors.items():
+        threads[name] = threading.Thread(target=run, args=(name, collector), daemon=True)
+        threads[name].start()
+
+    for name, thread in threads.items():
+        deadline = deadlines.get(name, COLLECTOR_DEFAULT_DEADLINE)
+        thread.join(max(0.0, start + deadline - time.monotonic()))
+
+    return {
+        name: results[name] if name in results else fallbacks.get(name, MetadataUnavailable())
+        for name in collectors
+    }
 
-    def run_git_command(command):
-        """
-        Run a git command and return the output.
-        Args:
-            command: the git command to run.
 
-        Returns: the output of the git command.
+def get_git_metadata(path: str = None):
+    """
+    get_git_metadata: Records the git information on the current workspace.
+    The repository files are read directly, and the result is cached until HEAD, the refs or the config change.
 
-        """
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True)
-        if result.returncode != 0:
-            raise Exception(f"Git command failed: {result.stderr}")
-        return result.stdout.strip()
+    Args:
+        path: the path in the workspace, default is the current directory.
 
-    # Check whether the directory is initialized with git
-    if run_git_command("[ -d .git ] && echo 1 || echo 0") == "0":
+    Returns: a dictionary of git metadata.
+    """
+    repository = find_repository(path)
+    if repository is None:
         return {
             "git_sha": "",
             "git_current_branch": "",
@@ -42,221 +90,376 @@ def get_git_metadata():
             "git_latest_commit_message": ""
         }
 
-    # Get latest commit hash
-    latest_commit_hash = run_git_command("git rev-parse HEAD")
-    latest_commit_author = run_git_command("git log -1 --pretty=%an")
-    latest_commit_message = run_git_command("git log -1 --pretty=%B")
-    latest_commit_timestamp = run_git_command("git log -1 --pretty=%ct")
-    latest_commit_date = datetime.utcfromtimestamp(int(latest_commit_timestamp)).strftime('%Y-%m-%d %H:%M:%S UTC')
-
-    # Get current branch name
-    current_branch = run_git_command("git rev-parse --abbrev-ref HEAD")
-
-    # Get remotes
-    remotes_raw = run_git_command("git remote -v")
-    remotes = {}
-    for line in remotes_raw.split('\n'):
-        if line:
-            name, url, typ = line.split()
-            if name not in remotes:
-                remotes[name] = {'fetchUrl': '', 'pushUrl': ''}
-            if typ == '(fetch)':
-                remotes[name]['fetchUrl'] = url
-            elif typ == '(push)':
-                remotes[name]['pushUrl'] = url
-
-    remote_list = []
-    for name, urls in remotes.items():
-        remote_list.append(
-            {
-                "remote_name": name,
-                "fetch_url": urls['fetchUrl'],
-                "push_url": urls['pushUrl']
-            }
-        )
+    cache = read_cache(CACHE_GIT_METADATA, default={})
+    cached = cache.get(repository.git_dir)
+    if cached and cached['fingerprint'] == repository.fingerprint(cached['metadata']['git_current_branch']):
+        return cached['metadata']
+
+    metadata = repository.metadata()
+    cache.pop(repository.git_dir, None)
+    cache[repository.git_dir] = {
+        'fingerprint': repository.fingerprint(metadata['git_current_branch']),
+        'metadata': metadata
+    }
+    # keep the most recently used repositories only
+    write_cache(CACHE_GIT_METADATA, dict(list(cache.items())[-GIT_CACHE_SIZE:]))
+
+    return metadata
+
+
+def get_project_metadata(path: str = None):
+    """
+    get_project_metadata: Records the project of the workspace, the memory is partitioned by the project.
+    The linked work trees of a repository share the same project.
+
+    Args:
+        path: the path in the workspace, default is the current directory.
+
+    Returns: a dictionary of the working directory, the git root and the project ID.
+    """
+    cwd = os.path.abspath(path or os.getcwd())
+    repository = find_repository(cwd)
+    if repository is None:
+        return {'cwd': cwd, 'git_root': '', 'project_id': hashlib.sha1(cwd.encode('utf-8', 'replace')).hexdigest()[:16]}
 
     return {
-        "git_sha": latest_commit_hash,
-        "git_current_branch": current_branch,
-        "git_remotes": remote_list,
-        "git_latest_commit_author": latest_commit_author,
-        "git_latest_commit_date": latest_commit_date,
-        "git_latest_commit_message": latest_commit_message
+        'cwd': cwd,
+        'git_root': repository.work_tree,
+        'project_id': hashlib.sha1(repository.common_dir.encode('utf-8', 'replace')).hexdigest()[:16]
     }
 
 
-def get_docker_metadata():
+def get_docker_metadata(
+        socket_path: str = None,
+        max_containers: int = DOCKER_MAX_CONTAINERS,
+        max_images: int = DOCKER_MAX_IMAGES,
+        ttl: int = DOCKER_METADATA_TTL
+):
     """
     Records the Docker containers and images information of the current workspace.
-    
+    The Docker Engine API is queried over the local socket, the result is capped and cached for a short TTL.
+
+    Args:
+        socket_path: the path of the Docker socket, default is detected automatically.
+        max_containers: the maximum number of containers, the running containers come first.
+        max_images: the maximum number of images, the most recent come first.
+        ttl: the time to live of the cached result in seconds.
+
     Returns:
         A dictionary with Docker containers and images metadata.
     """
+    client = DockerClient(socket_path)
+    cache = read_cache(CACHE_DOCKER_METADATA, default={})
+    cached = cache.get(str(client.socket_path))
+    if cached and time.time() - cached['updated_at'] <= ttl:
+        return cached['metadata']
+
+    def format_time(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else ""
+
+    info = client.info()
+    containers = [
+        {
+            'CONTAINER ID': container['Id'][:12],
+            'IMAGE': container.get('Image', ''),
+            'COMMAND': container.get('Command', ''),
+            'CREATED': format_time(container.get('Created')),
+            'STATUS': container.get('Status', ''),
+            'NAMES': ", ".join(name.lstrip('/') for name in container.get('Names') or []),
+            'PORTS': ", ".join(
+                f"{port['IP']}:{port['PublicPort']}->{port['PrivatePort']}/{port['Type']}"
+                if port.get('PublicPort') else f"{port['PrivatePort']}/{port['Type']}"
+                for port in container.get('Ports') or []
+            )
+        } for container in client.containers(max_containers)
+    ]
+
+    images = []
+    for image in client.images(max_images):
+        repo_tags = image.get('RepoTags') or ['<none>:<none>']
+        for repo_tag in repo_tags:
+            repository, _, tag = repo_tag.rpartition(':')
+            images.append({
+                'REPOSITORY': repository,
+                'TAG': tag,
+                'IMAGE ID': image['Id'].split(':')[-1][:12],
+                'CREATED': format_time(image.get('Created')),
+                'SIZE': f"{image.get('Size', 0) / 1000 ** 2:.1f}MB"
+            })
 
-    def parse_docker_output(output, headers):
-        """
-        Parses the output of a Docker command into a list of dictionaries based on provided headers.
-        
-        Args:
-            output: String output from Docker command.
-            headers: List of headers that correspond to Docker output columns.
-            
-        Returns:
-            List of dictionaries with Docker data.
-        """
-        entries = []
-        for line in output.strip().split('\n')[1:]:
-            parts = re.split(r'\s{2,}', line)
-            entry = {header: parts[i] if i < len(parts) else "" for i, header in enumerate(headers)}
-            entries.append(entry)
-        return entries
-
-    def run_command(command):
-        """
-        Executes a shell command and returns the output.
-        
-        Args:
-            command: List of command arguments.
-        
-        Returns:
-            A tuple of (success flag, output or error message).
-        """
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            raise Exception("Docker command failed: " + e.stderr)
-
-    containers_info = run_command(
-        [
-            "docker", "ps", "-a", "--format",
-            "table {{.ID}}\t{{.Image}}\t{{.Command}}\t{{.CreatedAt}}\t{{.Status}}\t{{.Names}}\t{{.Ports}}"
-        ]
-    )
-    containers_headers = ['CONTAINER ID', 'IMAGE', 'COMMAND', 'CREATED', 'STATUS', 'NAMES', 'PORTS']
-    containers = parse_docker_output(containers_info, containers_headers)
+    metadata = {
+        "docker_summary": f"{info.get('Containers', 0)} containers ({info.get('ContainersRunning', 0)} running), "
+                          f"{info.get('Images', 0)} images; showing {len(containers)} containers "
+                          f"(running first) and the {len(images)} most recent image tags",
+        "docker_containers": containers,
+        "docker_images": images[:max_images],
+    }
+    cache[str(client.socket_path)] = {'updated_at': time.time(), 'metadata': metadata}
+    write_cache(CACHE_DOCKER_METADATA, cache)
 
-    images_info = run_command(["docker", "images"])
-    images_headers = ['REPOSITORY', 'TAG', 'IMAGE ID', 'CREATED', 'SIZE']
-    images = parse_docker_output(images_info, images_headers)
+    return metadata
 
-    # docker_info = run_command(["docker", "info"])
-    # docker_headers = []
-    # docker = parse_docker_output(docker_info, docker_headers)
 
-    return {
-        # "docker_info": docker_info,
-        "docker_containers": containers,
-        "docker_images": images,
+def get_system_metadata(include_volatile: bool = False, ttl: int = SYSTEM_METADATA_TTL):
+    """
+    Records the system information. The snapshot is computed once and cached under the Termax home,
+    an expired snapshot is still returned and refreshed in the background.
+
+    Args:
+        include_volatile: if True, also sample the volatile fields (the available RAM).
+        ttl: the time to live of the snapshot in seconds.
+
+    Return a dictionary containing the system metadata.
+    """
+    snapshot = read_cache(CACHE_SYSTEM_METADATA)
+    # the Termax home can be shared across hosts, a snapshot from another host is never reused.
+    if not snapshot or snapshot.get('metadata', {}).get('hostname') != socket.gethostname():
+        snapshot = refresh_system_metadata()
+    elif time.time() - snapshot.get('updated_at', 0) > ttl:
+        threading.Thread(target=refresh_system_metadata, daemon=True).start()
+
+    metadata = dict(snapshot['metadata'])
+    if include_volatile:
+        metadata.update(get_memory_metadata())
+
+    return metadata
+
+
+def refresh_system_metadata():
+    """
+    Computes the system metadata snapshot and persists it.
+
+    Return the snapshot, in the format of {"updated_at": timestamp, "metadata": {...}}.
+    """
+    import psutil
+    hostname = socket.gethostname()
+    snapshot = {
+        'updated_at': time.time(),
+        'metadata': {
+            'platform': platform.system(),
+            'platform_release': platform.release(),
+            'platform_version': platform.version(),
+            'architecture': platform.machine(),
+            'hostname': hostname,
+            'ip_address': resolve_ip_address(hostname),
+            'physical_cores': psutil.cpu_count(logical=False),
+            'total_cores': psutil.cpu_count(logical=True),
+            'ram_total': round(psutil.virtual_memory().total / (1024.0 ** 3))
+        }
     }
+    write_cache(CACHE_SYSTEM_METADATA, snapshot)
+
+    return snapshot
 
 
-def get_system_metadata():
+def get_memory_metadata():
     """
-    Records the system information.
+    Samples the volatile memory information.
 
-    Return a dictionary containing the system metadata.
+    Return a dictionary containing the memory metadata.
     """
+    import psutil
+    memory = psutil.virtual_memory()
     return {
-        'platform': platform.system(),
-        'platform_release': platform.release(),
-        'platform_version': platform.version(),
-        'architecture': platform.machine(),
-        'hostname': socket.gethostname(),
-        'ip_address': socket.gethostbyname(socket.gethostname()),
-        'physical_cores': psutil.cpu_count(logical=False),
-        'total_cores': psutil.cpu_count(logical=True),
-        'ram_total': round(psutil.virtual_memory().total / (1024.0 ** 3)),
-        'ram_available': round(psutil.virtual_memory().available / (1024.0 ** 3)),
-        'ram_used_percent': psutil.virtual_memory().percent
+        'ram_total': round(memory.total / (1024.0 ** 3)),
+        'ram_available': round(memory.available / (1024.0 ** 3)),
+        'ram_used_percent': memory.percent
     }
 
 
+def resolve_ip_address(hostname: str, timeout: float = DNS_TIMEOUT):
+    """
+    Resolves the IP address of the host, a slow or broken resolver is given up after the timeout.
+
+    Args:
+        hostname: the hostname to resolve.
+        timeout: the timeout in seconds.
+
+    Return the IP address, or an empty string if it cannot be resolved in time.
+    """
+    result = {}
+
+    def resolve():
+        try:
+            result['ip_address'] = socket.gethostbyname(hostname)
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=resolve, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    return result.get('ip_address', '')
+
+
 def get_path_metadata():
     """
     Records the path information.
 
     Return a dictionary containing the path metadata.
     """
-    # List all executable commands by scanning the PATH directories
-    paths = os.environ['PATH'].split(os.pathsep)
-    commands = set()
-    for path in paths:
-        if os.path.exists(path):
-            try:
-                for item in os.listdir(path):
-                    item_path = os.path.join(path, item)
-                    if os.path.isfile(item_path) and os.access(item_path, os.X_OK):
-                        commands.add(item)
-            except PermissionError:
-                # This can happen if we don't have permission to list the contents of the directory
-                continue
-
     return {
-        "user": os.getlogin(),
+        "user": getpass.getuser(),
         "current_directory": os.getcwd(),
         "home_directory": os.path.expanduser("~"),
-        "executable_commands": sorted(list(commands))
+        "executable_commands": get_path_index().commands()
     }
 
 
-def get_file_metadata():
+def get_file_metadata(text: str = None, token_budget: int = FILE_TOKEN_BUDGET, scan_limit: int = FILE_SCAN_LIMIT):
     """
     get_file_metadata: Records the file information in the current directory.
+    Large directories are summarized, each section only keeps the most relevant and recent names within the budget.
+
+    Args:
+        text: the user's intent, names matching the intent are listed first.
+        token_budget: the token budget of each section.
+        scan_limit: stop scanning after this number of entries.
     """
-    result = {
+    sections = {
         "directory": [],
         "files": [],
         "invisible_files": [],
         "invisible_directory": []
     }
 
-    # Get the current directory
-    current_directory = os.getcwd()
-
-    # List all files and directories in the current directory
-    for item in os.listdir(current_directory):
-        # Build the full path of the item
-        item_path = os.path.join(current_directory, item)
-        # Check if the item is invisible (hidden)
-        if item.startswith('.'):
-            if os.path.isdir(item_path):
-                result["invisible_directory"].append(item)
-            else:
-                result["invisible_files"].append(item)
-        else:
-            if os.path.isdir(item_path):
-                result["directory"].append(item)
+    # List the entries in the current directory, the type comes from d_type without extra stat calls
+    scanned, truncated = 0, False
+    with os.scandir(os.getcwd()) as entries:
+        for entry in entries:
+            if scanned >= scan_limit:
+                truncated = True
+                break
+            scanned += 1
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            # Check if the item is invisible (hidden)
+            if entry.name.startswith('.'):
+                sections["invisible_directory" if is_dir else "invisible_files"].append(entry)
             else:
-                result["files"].append(item)
+                sections["directory" if is_dir else "files"].append(entry)
+
+    keywords = split_keywords(text)
+    result = {key: select_entries(entries, keywords, token_budget) for key, entries in sections.items()}
+    result["summary"] = summarize_entries(sections, result, truncated)
 
     return result
 
 
-def get_python_metadata():
+def select_entries(entries: list, keywords: set, token_budget: int):
+    """
+    select_entries: select the names to show within the token budget.
+
+    Args:
+        entries: the directory entries of a section.
+        keywords: the keywords of the user's intent.
+        token_budget: the token budget of the section.
+
+    Return: a list of names, ranked by relevance and recency if the section exceeds the budget.
+    """
+    names = [entry.name for entry in entries]
+    if sum(count_tokens(name) + 1 for name in names) <= token_budget:
+        return names
+
+    def rank(entry):
+        try:
+            mtime = entry.stat(follow_symlinks=False).st_mtime
+        except OSError:
+            mtime = 0
+        relevance = len(keywords & split_keywords(entry.name))
+        return -relevance, -mtime, entry.name
+
+    selected, used = [], 0
+    for entry in sorted(entries, key=rank):
+        used += count_tokens(entry.name) + 1
+        if used > token_budget:
+            break
+        selected.append(entry.name)
+
+    return selected
+
+
+def summarize_entries(sections: dict, selected: dict, truncated: bool):
+    """
+    summarize_entries: summarize the directory, grouping the files by extension.
+
+    Args:
+        sections: the scanned directory entries of each section.
+        selected: the names selected to show of each section.
+        truncated: whether the scan stopped before the end of the directory.
+
+    Return: a summary string.
+    """
+    files = sections["files"] + sections["invisible_files"]
+    directories = sections["directory"] + sections["invisible_directory"]
+    summary = f"{len(files)} files, {len(directories)} directories"
+    if truncated:
+        summary += f" (scan stopped after {len(files) + len(directories)} entries)"
+
+    omitted = sum(len(sections[key]) - len(selected[key]) for key in sections)
+    if omitted:
+        extensions = {}
+        for entry in files:
+            extension = os.path.splitext(entry.name)[1].lower() or "(none)"
+            extensions[extension] = extensions.get(extension, 0) + 1
+
+        top = sorted(extensions.items(), key=lambda item: item[1], reverse=True)[:FILE_SUMMARY_EXTENSIONS]
+        summary += f"; files by extension: {', '.join(f'{ext}: {count}' for ext, count in top)}"
+        summary += f"; {omitted} names omitted, the most relevant and recently modified are listed"
+
+    return summary
+
+
+def get_python_metadata(text: str = None):
     """
     get_python_metadata: Records the Python-related environment.
+    The installed packages are read in-process, and cached until the site-packages directories change.
+
+    Args:
+        text: the user's intent, if provided, only the packages mentioned in the intent are returned.
 
     Return: a dictionary containing the Python-related metadata.
     """
-    process = subprocess.run(["pip", "list"], capture_output=True, text=True)
-    pip_list_lines = process.stdout.strip().split("\n")[2:]  # Skip the header lines
-    pip_list = []
-    for line in pip_list_lines:
-        match = re.match(r"(\S+)\s+(\S+)(?:\s+(.*))?", line)
-        if match:
-            pip_list.append({
-                "package": match.group(1),
-                "version": match.group(2),
-                "location": match.group(3)
-            })
+    # the package directories on sys.path change their mtime once a package is installed or removed
+    fingerprint = {}
+    for path in sys.path:
+        try:
+            fingerprint[path] = os.stat(path or '.').st_mtime_ns
+        except OSError:
+            continue
+
+    cache = read_cache(CACHE_PYTHON_METADATA, default={})
+    cached = cache.get(sys.executable)
+    if cached and cached['fingerprint'] == fingerprint:
+        packages = cached['packages']
+    else:
+        packages = {}
+        for distribution in importlib.metadata.distributions():
+            name = distribution.metadata['Name']
+            # the first distribution on sys.path is the one imported
+            if name and name.lower() not in packages:
+                packages[name.lower()] = {"package": name, "version": distribution.version}
+        packages = sorted(packages.values(), key=lambda package: package['package'].lower())
+        cache[sys.executable] = {'fingerprint': fingerprint, 'packages': packages}
+        write_cache(CACHE_PYTHON_METADATA, cache)
+
+    if text is not None:
+        # match the normalized package names as whole words of the intent
+        text = re.sub(r'[-_.]+', '-', text.lower())
+        packages = [
+            package for package in packages
+            if re.search(rf"(?<![\w-]){re.escape(re.sub(r'[-_.]+', '-', package['package'].lower()))}(?![\w-])", text)
+        ]
 
     return {
         "python_version": f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}",
         "python_compiler": platform.python_compiler(),
         "python_implementation": platform.python_implementation(),
         "python_build": platform.python_build(),
-        "python_pip_packages": pip_list[2:],
+        "python_pip_packages": packages,
     }
 
 
@@ -269,7 +472,7 @@ def get_gpu_metadata():
     gpu_model_name = ""
     gpu_driver_version = ""
     cuda_version = ""
-    if shutil.which("nvidia-smi"):
+    if get_path_index().is_installed("nvidia-smi"):
         p = subprocess.run([
             "nvidia-smi",
             "--query-gpu=gpu_name,driver_version",
@@ -285,7 +488,7 @@ def get_gpu_metadata():
                 if other_model_name != gpu_model_name or other_driver_version != gpu_driver_version:
                     raise EnvironmentError("System is configured with different GPU models or driver versions.")
 
-    if shutil.which("nvcc"):
+    if get_path_index().is_installed("nvcc"):
         p = subprocess.run(["nvcc", "--version"], capture_output=True)
         match = re.search("\n.*release ([0-9]+\.[0-9]+).*\n", p.stdout.decode("utf-8"))
         cuda_version = match.group(1)
@@ -297,11 +500,11 @@ def get_gpu_metadata():
     }
 
 
-def get_command_history():
+def get_history_file():
     """
-    get_command_history: Get the command history of the current user including command times for zsh.
+    get_history_file: Detect the shell and the history file of the current user.
 
-    :return: A list of dictionaries with 'command' and optionally 'time' keys, where 'time' is in datetime format.
+    :return: A tuple of (shell type, history file, history format).
     """
     if sys.platform.startswith('linux') or sys.platform == 'darwin':
         # Attempt to detect the default shell from the $SHELL environment variable or /etc/passwd
@@ -309,67 +512,160 @@ def get_command_history():
         shell = os.environ.get('SHELL', pwd.getpwnam(getpass.getuser()).pw_shell)
 
         if 'bash' in shell:
-            shell_type = 'bash'
-            history_file = os.path.join(os.environ['HOME'], '.bash_history')
-            history_format = 'plain'
+            return 'bash', os.path.join(os.environ['HOME'], '.bash_history'), 'plain'
         elif 'zsh' in shell:
-            shell_type = 'zsh'
-            history_file = os.path.join(os.environ['HOME'], '.zsh_history')
-            history_format = 'with_time'
-        elif 'fish' in shell: # [TODO] Add a support for fish shell
-            shell_type = 'fish'
-            history_file = os.path.join(os.environ['HOME'], '.local/share/fish/fish_history')
-            history_format = 'yaml'
+            return 'zsh', os.path.join(os.environ['HOME'], '.zsh_history'), 'with_time'
+        elif 'fish' in shell:
+            return 'fish', os.path.join(os.environ['HOME'], '.local/share/fish/fish_history'), 'yaml'
         else:
             raise ValueError(f"Shell not supported or history file unknown for shell: {shell}")
 
     elif sys.platform == 'win32':
-        shell_type = 'powershell'
         history_file = os.path.join(os.environ['APPDATA'], 'Microsoft', 'Windows', 'PowerShell', 'PSReadLine',
                                     'ConsoleHost_history.txt')
-        history_format = 'plain'
+        return 'powershell', history_file, 'plain'
     else:
         raise ValueError(f"Platform not supported: {sys.platform}")
 
+
+def parse_command_history(data: bytes, history_format: str):
+    """
+    parse_command_history: Parse the raw history into commands, in the order of the file.
+
+    :param data: the raw bytes of complete history lines.
+    :param history_format: the format of the history, `plain`, `with_time` (zsh) or `yaml` (fish).
+    :return: A list of dictionaries with 'command' and 'time' keys.
+    """
+    history_lines = []
+    command = None
+    for line in data.split(b'\n'):
+        # Decode each line individually, replace errors
+        decoded_line = line.decode('utf-8', 'replace').strip()
+        if not decoded_line:
+            continue
+
+        if history_format == 'with_time':
+            # Regex to parse zsh history with timestamps
+            match = re.match(r'^: (\d+):\d+;(.*)', decoded_line)
+            if match:
+                history_lines.append({
+                    'command': match.group(2).strip(),
+                    'time': datetime.fromtimestamp(int(match.group(1))).strftime('%Y-%m-%d %H:%M:%S')
+                })
+        elif history_format == 'yaml':
+            if decoded_line.startswith('- cmd:'):
+                command = decoded_line[len('- cmd:'):].strip()
+            elif decoded_line.startswith('when:') and command is not None:
+                time_match = re.match(r'^when: (\d+)', decoded_line)
+                if time_match:
+                    history_lines.append({
+                        'command': command,
+                        'time': datetime.fromtimestamp(int(time_match.group(1))).strftime('%Y-%m-%d %H:%M:%S')
+                    })
+                command = None
+        else:
+            history_lines.append({'command': decoded_line, 'time': None})
+
+    return history_lines
+
+
+def find_history_tail(data, end: int, count: int, history_format: str):
+    """
+    find_history_tail: Walk backwards from the end of the history to the start of the last records.
+
+    :param data: the mapped history file.
+    :param end: the byte offset to walk backwards from.
+    :param count: the number of records to find.
+    :param history_format: the format of the history.
+    :return: The byte offset where the last `count` records start.
+    """
+    marker = HISTORY_RECORD_MARKERS[history_format]
+    found = 0
+    while end > 0:
+        start = data.rfind(b'\n', 0, end) + 1
+        line = data[start:end].strip()
+        if line and line.startswith(marker):
+            found += 1
+            if found >= count:
+                return start
+        end = start - 1
+
+    return 0
+
+
+def iter_command_history(history_file: str, history_format: str, offset: int = 0,
+                         chunk_size: int = HISTORY_CHUNK_SIZE):
+    """
+    iter_command_history: Stream the history forwards from a byte offset, without loading the whole file.
+
+    :param history_file: the path of the history file.
+    :param history_format: the format of the history.
+    :param offset: the byte offset to start from, the start of a record.
+    :param chunk_size: the number of bytes to read at a time.
+    :return: A generator of (commands, offset) tuples, the offset is where the unread records start.
+    """
+    with open(history_file, 'rb') as file:
+        file.seek(offset)
+        buffer = b''
+        while True:
+            chunk = file.read(chunk_size)
+            buffer += chunk
+            if chunk:
+                # keep the last record, it may continue in the next chunk
+                end = find_history_tail(buffer, len(buffer), 1, history_format)
+            else:
+                end = buffer.rfind(b'\n') + 1
+
+            if end > 0:
+                yield parse_command_history(buffer[:end], history_format), offset + end
+                offset += end
+                buffer = buffer[end:]
+            if not chunk:
+                return
+
+
+def get_command_history(count: int = COMMAND_HISTORY_COUNT):
+    """
+    get_command_history: Get the most recent commands of the current user including command times for zsh and fish.
+    The history is read backwards from the end of the file, and a byte-offset checkpoint is persisted,
+    so that the later calls only parse the newly appended lines.
+
+    :param count: the number of the most recent commands to return.
+    :return: A dictionary with a list of dictionaries with 'command' and 'time' keys, the most recent first.
+    """
     try:
-        history_lines = []
+        shell_type, history_file, history_format = get_history_file()
+        cache = read_cache(CACHE_COMMAND_HISTORY, default={})
+        checkpoint = cache.get(history_file)
+
         with open(history_file, 'rb') as file:  # Open as binary to handle potential non-UTF characters
-            for line in file:
-                try:
-                    # Decode each line individually, replace errors
-                    decoded_line = line.decode('utf-8', 'replace').strip()
-                    if history_format == 'with_time' and shell_type == 'zsh':
-                        # Regex to parse zsh history with timestamps
-                        match = re.match(r'^: (\d+):\d+;(.*)', decoded_line)
-                        if match:
-                            # Convert epoch time to datetime object and format it
-                            epoch_time = int(match.group(1))
-                            datetime_obj = datetime.fromtimestamp(epoch_time)
-                            formatted_time = datetime_obj.strftime('%Y-%m-%d %H:%M:%S')
-                            history_lines.append({
-                                'command': match.group(2).strip(),
-                                'time': formatted_time
-                            })
-                    elif history_format == 'yaml' and shell_type == 'fish':
-                        if decoded_line.startswith('- cmd:'):
-                            command_match = re.match(r'^- cmd: (.*)', decoded_line)
-                            command = command_match.group(1).strip() if command_match else None
-                        if decoded_line.startswith('when:'):
-                            time_match = re.match(r'^when: (\d+)', decoded_line)
-                            if time_match:
-                                epoch_time = int(time_match.group(1))
-                                datetime_obj = datetime.fromtimestamp(epoch_time)
-                                formatted_time = datetime_obj.strftime('%Y-%m-%d %H:%M:%S')
-                                history_lines.append({
-                                    'command': command,
-                                    'time': formatted_time
-                                })
-                    else:
-                        history_lines.append({'command': decoded_line, 'time': None})
-                except UnicodeDecodeError:
-                    # In case decoding fails, skip the line or handle appropriately
-                    continue
-            # Return all commands
-            return {"shell_command_history": history_lines[::-1]}
+            stat = os.fstat(file.fileno())
+            if stat.st_size == 0:
+                return {"shell_command_history": []}
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # only parse the complete lines, the last line may be still being written
+                end = data.rfind(b'\n') + 1
+                limit = max(count, HISTORY_CHECKPOINT_SIZE)
+                if checkpoint and checkpoint['inode'] == stat.st_ino and checkpoint['limit'] >= count \
+                        and checkpoint['offset'] <= end:
+                    history_lines = checkpoint['commands'] + parse_command_history(
+                        data[checkpoint['offset']:end], history_format)
+                else:
+                    # the history file is new, rotated or truncated, read the tail again.
+                    start = find_history_tail(data, end, limit, history_format)
+                    history_lines = parse_command_history(data[start:end], history_format)
+
+        if not checkpoint or checkpoint['offset'] != end or checkpoint['inode'] != stat.st_ino:
+            cache[history_file] = {
+                'inode': stat.st_ino,
+                'offset': end,
+                'limit': limit,
+                'commands': history_lines[-limit:]
+            }
+            # the checkpoint holds the recent commands, it is only readable by the user.
+            write_cache(CACHE_COMMAND_HISTORY, cache, mode=0o600)
+
+        return {"shell_command_history": history_lines[::-1][:count]}
     except Exception as e:
         return f"Failed to read history file: {e}"
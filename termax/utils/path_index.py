@@ -0,0 +1,186 @@
+import os
+import shlex
+
+from termax.utils.const import *
+from termax.utils.cache import read_cache, write_cache
+
+
+class PathIndex:
+    """
+    PathIndex: a persistent index of the executables under the PATH directories.
+    Each directory is keyed by its mtime, and only rescanned once its content has been changed.
+    """
+
+    def __init__(self, cache_name: str = CACHE_PATH_INDEX):
+        """
+        Args:
+            cache_name: the name of the cache file under the Termax home.
+        """
+        self.cache_name = cache_name
+        self.directories = read_cache(cache_name, default={})
+        self.paths = []
+        self._lookup = None
+
+    def refresh(self, paths: list = None):
+        """
+        refresh: rescan the changed PATH directories and persist the index.
+        Args:
+            paths: the directories to index, default is the current PATH.
+
+        Returns: the index itself.
+        """
+        if paths is None:
+            paths = os.environ.get('PATH', '').split(os.pathsep)
+
+        self.paths = [path for path in dict.fromkeys(paths) if path]
+        changed = False
+        for path in self.paths:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.directories.get(path)
+            if entry is None or entry['mtime'] != mtime:
+                self.directories[path] = {'mtime': mtime, 'commands': scan_executables(path)}
+                changed = True
+
+        if changed:
+            write_cache(self.cache_name, self.directories)
+        self._lookup = None
+
+        return self
+
+    def commands(self):
+        """
+        commands: all the executable commands available in the PATH.
+        """
+        return sorted(self.lookup().keys())
+
+    def lookup(self):
+        """
+        lookup: the mapping from the command name to the first PATH directory containing it.
+        """
+        if self._lookup is None:
+            self._lookup = {}
+            for path in self.paths:
+                for command in self.directories.get(path, {}).get('commands', []):
+                    self._lookup.setdefault(command, path)
+
+        return self._lookup
+
+    def which(self, name: str):
+        """
+        which: find the full path of an executable, like `shutil.which` but without any stat calls.
+        Args:
+            name: the name of the executable.
+
+        Returns: the full path of the executable, None if not found.
+        """
+        path = self.lookup().get(name)
+        return os.path.join(path, name) if path else None
+
+    def is_installed(self, name: str):
+        """
+        is_installed: check whether an executable is available in the PATH.
+        Args:
+            name: the name of the executable.
+        """
+        return name in self.lookup()
+
+
+def scan_executables(path: str):
+    """
+    scan_executables: list the executable files under a directory.
+    Args:
+        path: the directory to scan.
+
+    Returns: a sorted list of the executable names.
+    """
+    commands = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        commands.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        # This can happen if we don't have permission to list the contents of the directory
+        pass
+
+    return sorted(commands)
+
+
+_path_index = None
+
+
+def get_path_index():
+    """
+    get_path_index: get the PATH index of the current process, the refresh only stats the PATH directories.
+    """
+    global _path_index
+    if _path_index is None:
+        _path_index = PathIndex()
+    return _path_index.refresh()
+
+
+def is_installed(name: str):
+    """
+    is_installed: check whether an executable is available in the PATH.
+    Args:
+        name: the name of the executable.
+    """
+    return get_path_index().is_installed(name)
+
+
+def get_executables(command: str):
+    """
+    get_executables: list the executables invoked by a shell command, e.g. `ls` and `grep` in `ls | grep py`.
+    Args:
+        command: the shell command.
+
+    Returns: a list of the executable names, None if the command can not be parsed.
+    """
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        return None
+
+    executables = []
+    expect_executable = True
+    for token in tokens:
+        if set(token) <= set(SHELL_OPERATOR_CHARS):
+            expect_executable = token not in SHELL_REDIRECTIONS
+        elif expect_executable and '=' not in token.split('/')[0] and token not in SHELL_PREFIX_COMMANDS:
+            # skip the environment assignments and the wrappers, e.g. `FOO=1 sudo make`
+            executables.append(token)
+            expect_executable = False
+
+    return executables
+
+
+def validate_command(command: str):
+    """
+    validate_command: check whether a shell command is runnable here, all its executables should be available.
+    Args:
+        command: the shell command.
+    """
+    executables = get_executables(command)
+    if not executables:
+        return False
+
+    path_index = get_path_index()
+    for executable in executables:
+        if executable in SHELL_BUILTINS:
+            continue
+        elif os.sep in executable:
+            if not os.access(os.path.expanduser(executable), os.X_OK):
+                return False
+        elif not path_index.is_installed(executable):
+            return False
+
+    return True
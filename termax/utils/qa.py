@@ -1,6 +1,7 @@
-import inquirer
 from termax.utils.const import *
 
+# NOTE: inquirer is imported inside each question to keep it off the CLI startup path.
+
 
 def qa_platform(model_list: dict = CONFIG_LLM_LIST):
     """
@@ -9,6 +10,7 @@ def qa_platform(model_list: dict = CONFIG_LLM_LIST):
     Args:
         model_list: the list of models.
     """
+    import inquirer
     try:
         # Prompt for platform selection
         platform_question = [
@@ -78,6 +80,7 @@ def qa_general(model_list: dict = CONFIG_LLM_LIST):
     Args:
         model_list: the list of models.
     """
+    import inquirer
     try:
         exe_questions = [
             inquirer.List(
@@ -119,6 +122,7 @@ def qa_confirm():
     """
     qa_execute: ask the user confirm whether to execute the generated commmand.
     """
+    import inquirer
     try:
         exe_questions = [
             inquirer.List(
@@ -138,6 +142,7 @@ def qa_action():
     """
     qa_action: ask the user to choose the action to perform for guess output.
     """
+    import inquirer
     try:
         action_questions = [
             inquirer.List(
@@ -157,6 +162,7 @@ def qa_prompt():
     """
     qa_prompt: ask the user to input the prompt and intent.
     """
+    import inquirer
     try:
         command_questions = [
             inquirer.List(
@@ -185,6 +191,7 @@ def qa_revise():
     """
     qa_revise: ask the user to input the revised command.
     """
+    import inquirer
     try:
         revise_questions = [
             inquirer.Text(
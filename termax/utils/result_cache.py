@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+
+from termax.utils.const import *
+from termax.utils.cache import read_cache, write_cache
+from termax.utils.tokens import normalize_text
+
+
+def get_directory_fingerprint(path: str = None):
+    """
+    get_directory_fingerprint: a hash of the directory listing, the commands may refer to the files in it.
+    Args:
+        path: the directory, default is the current directory.
+
+    Returns: the hex digest of the sorted names, an empty string if the directory is not readable.
+    """
+    try:
+        names = sorted(os.listdir(path or os.getcwd()))
+    except OSError:
+        return ''
+    return hashlib.sha1('\x00'.join(names).encode('utf-8', 'replace')).hexdigest()
+
+
+class ResultCache:
+    """
+    ResultCache: cache the generated commands by the intent and the environment, the repeated intents skip the LLM.
+    """
+
+    def __init__(self, ttl: int = RESULT_CACHE_TTL, size: int = RESULT_CACHE_SIZE):
+        """
+        Args:
+            ttl: the time to live of each command in seconds.
+            size: the maximum number of commands, the oldest ones are evicted.
+        """
+        self.ttl = ttl
+        self.size = size
+
+    @staticmethod
+    def make_key(text: str, platform: str, model_name: str, cwd: str = None):
+        """
+        make_key: the cache key of an intent in the current environment.
+        Args:
+            text: the natural language text.
+            platform: the platform of the model, e.g. `openai`.
+            model_name: the name of the model.
+            cwd: the working directory, default is the current directory.
+
+        Returns: the cache key.
+        """
+        cwd = cwd or os.getcwd()
+        fingerprint = [
+            normalize_text(text), os.name, platform, model_name or '', cwd, get_directory_fingerprint(cwd)
+        ]
+        return hashlib.sha256('\x00'.join(fingerprint).encode('utf-8', 'replace')).hexdigest()
+
+    def read(self):
+        """
+        read: read the cached commands and the counters.
+        """
+        results = read_cache(CACHE_RESULTS, {}).get('results', {})
+        stats = read_cache(CACHE_RESULT_STATS, {})
+        return {'results': results, 'hits': stats.get('hits', 0), 'misses': stats.get('misses', 0)}
+
+    def count(self, hit: bool):
+        """
+        count: count a hit or a miss, the counters are kept in a small file, a lookup never rewrites the results.
+        Args:
+            hit: True for a hit, False for a miss.
+        """
+        stats = read_cache(CACHE_RESULT_STATS, {})
+        field = 'hits' if hit else 'misses'
+        stats[field] = stats.get(field, 0) + 1
+        write_cache(CACHE_RESULT_STATS, stats)
+
+    def get(self, key: str):
+        """
+        get: get the cached command, and count the hit or the miss.
+        Args:
+            key: the cache key.
+
+        Returns: the command, None if it is missing or expired.
+        """
+        entry = read_cache(CACHE_RESULTS, {}).get('results', {}).get(key)
+        # the expired commands are dropped by the next `set`.
+        if entry is not None and time.time() - entry['created_at'] > self.ttl:
+            entry = None
+
+        self.count(entry is not None)
+        return entry['command'] if entry is not None else None
+
+    def set(self, key: str, command: str):
+        """
+        set: cache a command, then evict the expired ones and the oldest ones beyond the size.
+        Args:
+            key: the cache key.
+            command: the command.
+        """
+        now = time.time()
+        results = {
+            cached_key: entry for cached_key, entry in read_cache(CACHE_RESULTS, {}).get('results', {}).items()
+            if cached_key != key and now - entry['created_at'] <= self.ttl
+        }
+        results[key] = {'command': command, 'created_at': now}
+
+        # the results are kept in the insertion order, the oldest come first.
+        for stale in list(results)[:max(0, len(results) - self.size)]:
+            del results[stale]
+        write_cache(CACHE_RESULTS, {'results': results})
+
+    def stats(self):
+        """
+        stats: the counters of the cache.
+
+        Returns: a dictionary of the hits, the misses, the hit rate and the number of commands.
+        """
+        data = self.read()
+        lookups = data['hits'] + data['misses']
+        return {
+            'hits': data['hits'],
+            'misses': data['misses'],
+            'hit_rate': data['hits'] / lookups if lookups else 0.0,
+            'size': len(data['results'])
+        }
+
+    def clear(self):
+        """
+        clear: remove all the cached commands and reset the counters.
+        """
+        write_cache(CACHE_RESULTS, {})
+        write_cache(CACHE_RESULT_STATS, {})
@@ -0,0 +1,81 @@
+import re
+import functools
+import importlib.util
+
+# a rough estimation for English text and shell commands, most tokenizers average ~4 characters per token.
+CHARS_PER_TOKEN = 4
+TOKENIZER_ENCODING = 'cl100k_base'
+
+
+@functools.lru_cache(maxsize=1)
+def get_tokenizer():
+    """
+    get_tokenizer: load the local tokenizer, tiktoken is optional.
+
+    Returns: the tiktoken encoding, None if tiktoken is not installed or the encoding is not available.
+    """
+    if importlib.util.find_spec('tiktoken') is None:
+        return None
+
+    try:
+        return importlib.import_module('tiktoken').get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        # the encoding is downloaded on the first use, which may fail offline.
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str):
+    """
+    count_tokens: count the number of tokens of a text with the local tokenizer, or estimate it without one.
+    The results are cached per string, the same names and samples are counted again and again.
+    Args:
+        text: the text to count.
+
+    Returns: the number of tokens.
+    """
+    if not text:
+        return 0
+
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def split_keywords(text: str):
+    """
+    split_keywords: split a text into lower-cased keywords, used to rank names by relevance.
+    Args:
+        text: the text to split.
+
+    Returns: a set of keywords.
+    """
+    if not text:
+        return set()
+    return {word for word in re.split(r'[^0-9a-z]+', text.lower()) if len(word) > 1}
+
+
+def split_terms(text: str):
+    """
+    split_terms: split a text into lower-cased terms, the repeated terms are kept to count their frequencies.
+    The terms are split on the Unicode word boundaries, a single non-ASCII character is a term, e.g. in Chinese.
+    Args:
+        text: the text to split.
+
+    Returns: a list of terms.
+    """
+    if not text:
+        return []
+    return [word for word in re.split(r'\W+', text.lower(), flags=re.UNICODE) if len(word) > 1 or not word.isascii()]
+
+
+def normalize_text(text: str):
+    """
+    normalize_text: normalize a text before hashing, the near-repeated texts share the same key.
+    Args:
+        text: the text to normalize.
+
+    Returns: the lower-cased text with the whitespaces collapsed.
+    """
+    return ' '.join(text.split()).lower()
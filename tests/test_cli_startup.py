@@ -0,0 +1,64 @@
+import sys
+import json
+import unittest
+import subprocess
+
+# the modules which are only needed to generate the commands, they are slow to import.
+HEAVY_MODULES = ['chromadb', 'openai', 'rich', 'inquirer']
+# the cumulative import time of the CLI in microseconds, it is ~80ms on a laptop.
+IMPORT_TIME_BUDGET = 500_000
+
+RUN_COMMAND = """
+import sys
+import json
+from termax.cli.cli import cli
+
+try:
+    cli.main(sys.argv[1:], prog_name='termax')
+except SystemExit:
+    pass
+print(json.dumps([name for name in json.loads(sys.stdin.read()) if name in sys.modules]))
+"""
+
+
+def run_command(*args):
+    """
+    run_command: run a CLI command in a fresh process with the import time profiled.
+
+    Returns: the heavy modules loaded by the command, and the cumulative import time of the CLI in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUN_COMMAND, *args],
+        input=json.dumps(HEAVY_MODULES), capture_output=True, text=True, check=True
+    )
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    import_time = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if line.startswith('import time:') and len(fields) == 3 and fields[2].strip() == 'termax.cli.cli':
+            import_time = int(fields[1])
+    return loaded, import_time
+
+
+class TestCLIStartup(unittest.TestCase):
+    def assert_light(self, *args):
+        loaded, import_time = run_command(*args)
+        self.assertEqual(loaded, [], f"`termax {' '.join(args)}` imported {loaded}")
+        self.assertLess(import_time, IMPORT_TIME_BUDGET, f"`termax {' '.join(args)}` took {import_time}us to import")
+
+    def test_version(self):
+        self.assert_light('--version')
+
+    def test_config(self):
+        self.assert_light('config', '--help')
+
+    def test_install(self):
+        self.assert_light('install', '--help')
+
+    def test_uninstall(self):
+        self.assert_light('uninstall', '--help')
+
+
+if __name__ == '__main__':
+    unittest.main()
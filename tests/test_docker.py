@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import socketserver
+from unittest import mock
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from termax.utils.metadata import get_docker_metadata
+
+CONTAINERS = [
+    {'Id': 'a' * 64, 'Image': 'nginx', 'Command': 'nginx', 'Created': 1700000300, 'Status': 'Exited (0)',
+     'Names': ['/exited-new'], 'Ports': [], 'State': 'exited'},
+    {'Id': 'b' * 64, 'Image': 'redis', 'Command': 'redis-server', 'Created': 1700000100, 'Status': 'Up 2 hours',
+     'Names': ['/running-old'], 'Ports': [{'PrivatePort': 6379, 'Type': 'tcp'}], 'State': 'running'},
+    {'Id': 'c' * 64, 'Image': 'postgres', 'Command': 'postgres', 'Created': 1700000200, 'Status': 'Exited (1)',
+     'Names': ['/exited-old'], 'Ports': [], 'State': 'exited'},
+]
+IMAGES = [
+    {'Id': f"sha256:{str(i) * 64}", 'RepoTags': [f"image{i}:latest"], 'Created': 1700000000 + i, 'Size': 10 ** 6}
+    for i in range(5)
+]
+INFO = {'Containers': 3, 'ContainersRunning': 1, 'Images': 5}
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    """
+    FakeDockerHandler: answer the Docker Engine API requests with the canned responses.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.server.requests.append(url.path)
+
+        if url.path == '/info':
+            body = INFO
+        elif url.path == '/containers/json':
+            containers = sorted(CONTAINERS, key=lambda container: container['Created'], reverse=True)
+            if 'filters' in params:
+                states = json.loads(params['filters'][0]).get('status', [])
+                containers = [container for container in containers if container['State'] in states]
+            elif 'all' not in params:
+                containers = [container for container in containers if container['State'] == 'running']
+            if 'limit' in params:
+                containers = containers[:int(params['limit'][0])]
+            body = containers
+        elif url.path == '/images/json':
+            body = IMAGES
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDockerMetadata(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix='termax-test-')
+        self.socket_path = os.path.join(self.home, 'docker.sock')
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, FakeDockerHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        # keep the metadata cache out of the real Termax home.
+        self.patcher = mock.patch('termax.utils.cache.CONFIG_HOME', self.home)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def test_running_first(self):
+        metadata = get_docker_metadata(self.socket_path)
+        names = [container['NAMES'] for container in metadata['docker_containers']]
+        self.assertEqual(names, ['running-old', 'exited-new', 'exited-old'])
+        self.assertEqual(metadata['docker_containers'][0]['PORTS'], '6379/tcp')
+        self.assertIn('3 containers (1 running), 5 images', metadata['docker_summary'])
+
+    def test_caps(self):
+        metadata = get_docker_metadata(self.socket_path, max_containers=2, max_images=2)
+        self.assertEqual([container['NAMES'] for container in metadata['docker_containers']],
+                         ['running-old', 'exited-new'])
+        self.assertEqual([image['REPOSITORY'] for image in metadata['docker_images']], ['image4', 'image3'])
+
+    def test_ttl_cache(self):
+        first = get_docker_metadata(self.socket_path)
+        requests = len(self.server.requests)
+        self.assertEqual(get_docker_metadata(self.socket_path), first)
+        self.assertEqual(len(self.server.requests), requests)
+
+        # an expired result is fetched again.
+        get_docker_metadata(self.socket_path, ttl=-1)
+        self.assertGreater(len(self.server.requests), requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
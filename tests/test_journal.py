@@ -0,0 +1,105 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+from termax.prompt.memory import Memory
+from termax.prompt.journal import append_journal, flush_journal, get_journal_path
+from termax.utils.const import *
+
+
+def fake_embedding(texts):
+    """
+    fake_embedding: a deterministic embedding of the texts, no embedding model is loaded.
+    """
+    return [[byte / 255 for byte in hashlib.sha1(text.encode('utf-8')).digest()[:8]] for text in texts]
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix='termax-test-')
+        self.patchers = [
+            mock.patch('termax.utils.cache.CONFIG_HOME', self.home),
+            mock.patch('termax.prompt.memory.Config'),
+            # a small batch, so that a flush is interrupted between the batches.
+            mock.patch('termax.prompt.journal.JOURNAL_BATCH_SIZE', 2)
+        ]
+        _, config, _ = [patcher.start() for patcher in self.patchers]
+        config.return_value.read.return_value = {CONFIG_SEC_GENERAL: {'memory_backend': MEMORY_BACKEND_FLAT}}
+        self.memory = Memory(data_path=self.home)
+        self.memory.embedding_function.embedding_function = fake_embedding
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def append(self, query: str, ts: float):
+        with mock.patch('termax.prompt.journal.time.time', return_value=ts):
+            append_journal(query, f"echo {query}", data_path=self.home)
+
+    def records(self):
+        records = self.memory.get()
+        return {document: metadata for document, metadata in zip(records['documents'], records['metadatas'])}
+
+    def test_repeats(self):
+        self.append('a', 1000.0)
+        self.append('b', 1001.0)
+        self.append('a', 1002.0)
+        self.assertEqual(flush_journal(self.memory, data_path=self.home), 3)
+
+        records = self.records()
+        self.assertEqual(records['a']['hit_count'], 1)
+        self.assertEqual(records['a']['created_ts'], 1000.0)
+        self.assertEqual(records['a']['last_used_at'], 1002.0)
+        self.assertEqual(records['b']['hit_count'], 0)
+
+        # a hit of an existing record is dated when it was saved.
+        self.append('b', 1003.0)
+        flush_journal(self.memory, data_path=self.home)
+        self.assertEqual(self.records()['b']['hit_count'], 1)
+        self.assertEqual(self.records()['b']['last_used_at'], 1003.0)
+
+    def test_project(self):
+        with mock.patch('termax.prompt.journal.time.time', return_value=1000.0):
+            append_journal('build', 'make', {'cwd': '/a', 'git_root': '', 'project_id': 'a'}, data_path=self.home)
+        flush_journal(self.memory, data_path=self.home)
+        with mock.patch('termax.prompt.journal.time.time', return_value=1001.0):
+            append_journal('build', 'make', {'cwd': '/b', 'git_root': '/b', 'project_id': 'b'}, data_path=self.home)
+        flush_journal(self.memory, data_path=self.home)
+
+        # the record moves to the project where it was used last.
+        self.assertEqual(self.records()['build']['project_id'], 'b')
+        self.assertEqual(self.records()['build']['git_root'], '/b')
+        results = self.memory.search(['build'], project_id='b', mode=RETRIEVAL_LEXICAL)
+        self.assertEqual(results['documents'][0], ['build'])
+
+    def test_replay(self):
+        for i, query in enumerate(['a', 'b', 'a', 'c', 'a', 'b']):
+            self.append(query, 1000.0 + i)
+
+        add_query = self.memory.add_query
+        calls = []
+
+        def interrupted(queries, *args, **kwargs):
+            calls.append(queries)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return add_query(queries, *args, **kwargs)
+
+        with mock.patch.object(self.memory, 'add_query', interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                flush_journal(self.memory, data_path=self.home)
+        self.assertTrue(os.path.exists(get_journal_path(self.home) + '.flushing'))
+
+        # the batches added before the interruption are not added again.
+        self.assertEqual(flush_journal(self.memory, data_path=self.home), 4)
+        records = self.records()
+        self.assertEqual({query: records[query]['hit_count'] for query in records}, {'a': 2, 'b': 1, 'c': 0})
+        self.assertFalse(os.path.exists(get_journal_path(self.home) + '.flushing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from termax.prompt.memory import Memory, make_record_id
+from termax.prompt.lexical import LexicalIndex
+from termax.utils.const import *
+
+EMBEDDINGS = {'list files': [1.0, 0.0], 'disk usage': [0.0, 1.0], 'disk free': [0.9, 0.1]}
+
+
+def fake_embedding(texts):
+    """
+    fake_embedding: the known embeddings of the records, the other texts are close to `list files`.
+    """
+    return [EMBEDDINGS.get(text, [1.0, 0.0]) for text in texts]
+
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix='termax-test-')
+        self.index = LexicalIndex(f"{self.home}/lexical.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def test_bm25(self):
+        self.index.add(['status', 'diff', 'list'], ['git status', 'git log git diff', 'ls -la'])
+        ranked = self.index.search('git')
+        # the repeated term outweighs the longer document, the unmatched documents are absent.
+        self.assertEqual([record_id for record_id, _ in ranked], ['diff', 'status'])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+
+        self.index.delete(['diff'])
+        self.assertEqual([record_id for record_id, _ in self.index.search('git')], ['status'])
+
+    def test_unicode(self):
+        self.index.add(['list', 'log'], ['列出 文件 ls', 'café_log tail'])
+        self.assertEqual(self.index.search('列出')[0][0], 'list')
+        self.assertEqual(self.index.search('CAFÉ_LOG')[0][0], 'log')
+
+
+class TestHybridSearch(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix='termax-test-')
+        self.patchers = [
+            mock.patch('termax.utils.cache.CONFIG_HOME', self.home),
+            mock.patch('termax.prompt.memory.Config')
+        ]
+        _, config = [patcher.start() for patcher in self.patchers]
+        config.return_value.read.return_value = {CONFIG_SEC_GENERAL: {'memory_backend': MEMORY_BACKEND_FLAT}}
+        self.memory = Memory(data_path=self.home)
+        self.memory.embedding_function.embedding_function = fake_embedding
+
+        queries = [{'query': 'list files', 'response': 'ls -la'}, {'query': 'disk usage', 'response': 'du -sh'},
+                   {'query': 'disk free', 'response': 'df -h'}]
+        self.memory.add_query(queries, embeddings=fake_embedding([query['query'] for query in queries]))
+        self.ids = {query['query']: make_record_id(query['query'], query['response']) for query in queries}
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def test_fusion(self):
+        results = self.memory.search(['disk'], n_results=3, mode=RETRIEVAL_HYBRID)
+        # `disk free` is ranked by both the vectors and the keywords, `list files` by the vectors only.
+        self.assertEqual(results['ids'][0][0], self.ids['disk free'])
+        self.assertEqual(set(results['ids'][0]), set(self.ids.values()))
+        self.assertEqual(results['scores'][0], sorted(results['scores'][0], reverse=True))
+
+        lexical = self.memory.search(['disk'], n_results=3, mode=RETRIEVAL_LEXICAL)
+        self.assertEqual(set(lexical['ids'][0]), {self.ids['disk usage'], self.ids['disk free']})
+
+    def test_loading(self):
+        function = self.memory.embedding_function
+        with mock.patch.object(type(function), 'loading', new_callable=mock.PropertyMock, return_value=True):
+            # the model is not waited for, the keywords serve the query meanwhile.
+            results = self.memory.search(['disk space'], n_results=3, mode=RETRIEVAL_HYBRID)
+            self.assertEqual(set(results['ids'][0]), {self.ids['disk usage'], self.ids['disk free']})
+            self.assertEqual(results['distances'][0], [None, None])
+
+            # the cached query texts need no model.
+            function(['disk space'])
+            results = self.memory.search(['disk space'], n_results=3, mode=RETRIEVAL_HYBRID)
+            self.assertIn(self.ids['list files'], results['ids'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from termax.prompt.memory import Memory
+from termax.prompt.snapshot import export_snapshot, import_snapshot
+from termax.utils.const import *
+
+RECORDS = 25
+
+
+def fake_embedding(texts):
+    """
+    fake_embedding: a deterministic embedding of the texts, no embedding model is loaded.
+    """
+    return [[float(len(text)), 1.0, -0.5] for text in texts]
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix='termax-test-')
+        self.patchers = [
+            mock.patch('termax.utils.cache.CONFIG_HOME', self.home),
+            mock.patch('termax.prompt.memory.Config')
+        ]
+        _, self.config = [patcher.start() for patcher in self.patchers]
+
+        self.source = self.open_memory('source')
+        self.source.add_query(
+            [{'query': f"echo {i}", 'response': f"echo {i}", 'hit_count': i} for i in range(RECORDS)],
+            embeddings=fake_embedding([f"echo {i}" for i in range(RECORDS)])
+        )
+        self.path = os.path.join(self.home, 'memory.snapshot')
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def open_memory(self, name: str, config: dict = None):
+        self.config.return_value.read.return_value = {
+            CONFIG_SEC_GENERAL: {'memory_backend': MEMORY_BACKEND_FLAT}, **(config or {})
+        }
+        memory = Memory(data_path=os.path.join(self.home, name))
+        memory.embedding_function.embedding_function = fake_embedding
+        return memory
+
+    def test_round_trip(self):
+        self.assertEqual(export_snapshot(self.source, self.path, chunk_size=10), RECORDS)
+        self.assertEqual([name for name in os.listdir(self.home) if name.startswith('.memory.snapshot')], [])
+
+        # the target is configured with another model, its empty collection takes the model of the snapshot.
+        target = self.open_memory('target', {CONFIG_SEC_OPENAI: {CONFIG_SEC_API_KEY: 'key'}})
+        self.assertNotEqual(target.embedding_function.model_name, DEFAULT_EMBEDDING_MODEL)
+        self.assertEqual(import_snapshot(target, self.path), RECORDS)
+        self.assertEqual(target.embedding_function.model_name, DEFAULT_EMBEDDING_MODEL)
+
+        include = ['documents', 'metadatas', 'embeddings']
+        source, imported = self.source.get(), target.get()
+        self.assertEqual(sorted(imported['ids']), sorted(source['ids']))
+        for record_id in source['ids']:
+            expected = self.source.collection().get(ids=[record_id], include=include)
+            actual = target.collection().get(ids=[record_id], include=include)
+            self.assertEqual(actual, expected)
+
+        # a collection of another model with records is rejected.
+        other = self.open_memory('other', {CONFIG_SEC_OPENAI: {CONFIG_SEC_API_KEY: 'key'}})
+        other.add_query([{'query': 'ls', 'response': 'ls'}], embeddings=fake_embedding(['ls']))
+        with self.assertRaises(ValueError):
+            import_snapshot(other, self.path)
+
+    def test_truncated(self):
+        export_snapshot(self.source, self.path, chunk_size=10)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        for size in (len(SNAPSHOT_MAGIC) + 2, len(data) // 2, len(data) - 1):
+            with open(self.path, 'wb') as file:
+                file.write(data[:size])
+            target = self.open_memory(f"target-{size}")
+            with self.assertRaises(ValueError):
+                import_snapshot(target, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import warnings
+import subprocess
+
+from termax.prompt.vector_store import FlatClient
+
+WRITERS = 4
+RECORDS = 50
+
+# add the records one by one and count a hit of the first one each time, as the concurrent `t` processes do.
+WRITE_RECORDS = """
+import sys
+from termax.prompt.vector_store import FlatClient
+
+path, writer, records = sys.argv[1], sys.argv[2], int(sys.argv[3])
+collection = FlatClient(path).get_or_create_collection('history')
+for i in range(records):
+    collection.add(ids=[f"{writer}-{i}"], embeddings=[[float(i), 1.0]], documents=[f"echo {i}"],
+                   metadatas=[{'hit_count': 0}])
+    hits = collection.get(ids=['shared'])['metadatas'][0]['hit_count']
+    collection.update(ids=['shared'], metadatas=[{'hit_count': hits + 1}])
+"""
+
+
+class TestFlatCollection(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='termax-test-')
+        self.collection = FlatClient(self.path).get_or_create_collection('history')
+        self.collection.add(ids=['shared'], embeddings=[[0.0, 1.0]], documents=['shared'], metadatas=[{'hit_count': 0}])
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_concurrent_writers(self):
+        processes = [
+            subprocess.Popen([sys.executable, '-c', WRITE_RECORDS, self.path, str(writer), str(RECORDS)])
+            for writer in range(WRITERS)
+        ]
+        for process in processes:
+            self.assertEqual(process.wait(), 0)
+
+        self.assertEqual(self.collection.count(), WRITERS * RECORDS + 1)
+        # the read and the update of the counter are not atomic, only the writes are, some hits may be lost.
+        self.assertGreater(self.collection.get(ids=['shared'])['metadatas'][0]['hit_count'], 0)
+        result = self.collection.query(query_embeddings=[[3.0, 1.0]], n_results=1)
+        self.assertEqual(result['documents'][0][0], 'echo 3')
+
+    def test_corrupt_records(self):
+        with open(self.collection.records_path, 'ab') as file:
+            file.write(b'{"id": broken\n')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            collection = FlatClient(self.path).get_or_create_collection('history')
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(collection.count(), 0)
+
+        # the corrupt file is kept aside, the next write never overwrites it.
+        collection.add(ids=['new'], embeddings=[[1.0, 0.0]], documents=['new'])
+        corrupt = [name for name in os.listdir(collection.path) if name.startswith('records.jsonl.corrupt-')]
+        self.assertEqual(len(corrupt), 1)
+        with open(os.path.join(collection.path, corrupt[0]), 'rb') as file:
+            self.assertIn(b'"shared"', file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()